@@ -0,0 +1,297 @@
+# benchmarks/fakes.py
+"""
+Dublês locais para os benchmarks e testes de carga (nada sai para a internet):
+  - FixtureServer:    servidor HTTP que serve os feeds e artigos gravados em benchmarks/fixtures
+  - FakeGeminiClient: mesmo formato do genai.Client (models / aio.models), com latência configurável
+  - FakeSMTPServer:   servidor SMTP mínimo (EHLO, AUTH, MAIL, RCPT, DATA) que só conta as mensagens
+"""
+import asyncio
+import html
+import http.server
+import json
+import os
+import random
+import re
+import socketserver
+import threading
+import time
+from types import SimpleNamespace
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Qual página gravada serve os artigos de cada feed
+ARTICLE_TEMPLATES = {
+    "economia": "longo_pt.html",
+    "tecnologia": "curto_pt.html",
+    "world-tech": "medio_en.html",
+}
+
+
+def _read_fixture(*parts):
+    with open(os.path.join(FIXTURES_DIR, *parts), encoding="utf-8") as f:
+        return f.read()
+
+
+class FixtureServer:
+    """
+    Serve em 127.0.0.1 (porta livre):
+      /feeds/<nome>.xml             o feed gravado (qualquer nome: /feeds/economia-17.xml usa economia.xml)
+      /articles/<feed>-<n>.html     a página gravada do feed, com o título da entrada
+    'latency' (segundos) simula a rede em cada resposta.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.feeds = {}
+        self.titles = {}
+        for filename in os.listdir(os.path.join(FIXTURES_DIR, "feeds")):
+            name = filename.rsplit(".", 1)[0]
+            self.feeds[name] = _read_fixture("feeds", filename)
+        self.templates = {name: _read_fixture("articles", page) for name, page in ARTICLE_TEMPLATES.items()}
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def feed_urls(self):
+        return [f"{self.base_url}/feeds/{name}.xml" for name in sorted(self.feeds)]
+
+    def start(self):
+        fixture = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if fixture.latency:
+                    time.sleep(fixture.latency)
+                body, content_type = fixture.render(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                data = body.encode("utf-8")
+                with fixture._lock:
+                    fixture.requests += 1
+                    fixture.bytes_sent += len(data)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._index_titles()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _index_titles(self):
+        """Título de cada artigo (slug -> título), lido dos próprios feeds."""
+        for xml in self.feeds.values():
+            for title, slug in re.findall(r"<title>([^<]+)</title>\s*<link(?:>| href=\")\{base\}/articles/([\w-]+)\.html", xml):
+                self.titles[slug] = html.unescape(title)
+
+    def _family(self, name):
+        """'economia-17' -> 'economia' (feeds sintéticos reaproveitam a fixture da família)."""
+        for family in sorted(self.feeds, key=len, reverse=True):
+            if name == family or name.startswith(family + "-"):
+                return family
+        return None
+
+    def render(self, path):
+        path = path.split("?", 1)[0]
+        match = re.fullmatch(r"/feeds/([\w-]+)\.xml", path)
+        if match:
+            family = self._family(match.group(1))
+            if family is None:
+                return None, None
+            xml = self.feeds[family]
+            if match.group(1) != family:
+                # Feed sintético: mesmas entradas, links e GUIDs próprios
+                xml = xml.replace(f"/articles/{family}-", f"/articles/{match.group(1)}-")
+                xml = xml.replace(f"urn:bench:{family}-", f"urn:bench:{match.group(1)}-")
+                xml = xml.replace(f"<guid isPermaLink=\"false\">{family}-", f"<guid isPermaLink=\"false\">{match.group(1)}-")
+            return xml.replace("{base}", self.base_url), "application/rss+xml; charset=utf-8"
+
+        match = re.fullmatch(r"/articles/([\w-]+)-(\d+)\.html", path)
+        if match:
+            family = self._family(match.group(1))
+            if family is None:
+                return None, None
+            title = self.titles.get(f"{family}-{match.group(2)}", "Notícia")
+            page = self.templates[family].replace("{title}", title).replace("{base}", self.base_url)
+            return page, "text/html; charset=utf-8"
+
+        return None, None
+
+
+class FakeGeminiClient:
+    """
+    Imita o genai.Client: client.models.generate_content(...) e client.aio.models.generate_content(...).
+    Cada chamada espera 'latency' segundos (+/- 'jitter') e responde no formato que o NewsCurator espera:
+    lista de IDs na curadoria, JSON {"summaries": [...]} no resumo em lote, Markdown no resto.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        client = self
+
+        class _Models:
+            def generate_content(self, model=None, contents=None, config=None, **kwargs):
+                time.sleep(client._delay())
+                return client._respond(contents, config)
+
+        class _AsyncModels:
+            async def generate_content(self, model=None, contents=None, config=None, **kwargs):
+                await asyncio.sleep(client._delay())
+                return client._respond(contents, config)
+
+        self.models = _Models()
+        self.aio = SimpleNamespace(models=_AsyncModels())
+
+    def _delay(self):
+        with self._lock:
+            return max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0)
+
+    def _respond(self, contents, config):
+        contents = str(contents)
+        json_mode = bool(config) and "json" in str(config)
+
+        if json_mode and "summaries" in contents:
+            ids = [int(i) for i in re.findall(r'"id": (\d+)', contents)]
+            text = json.dumps({"summaries": [{"id": i, "summary": self._summary(i)} for i in ids]}, ensure_ascii=False)
+        elif json_mode:
+            ids = [int(i) for i in re.findall(r"ID: (\d+)", contents)]
+            text = json.dumps(ids[:max(len(ids) // 4, 1)] if ids else [])
+        elif "Editor Chefe" in contents:
+            text = "# KARTEIRO\n## Visão Geral\nUm dia movimentado.\n## Destaques\n- Juros\n- IA\n## O que observar\nNovos dados."
+        else:
+            text = self._summary(0)
+
+        tokens_in = max(len(contents) // 4, 1)
+        tokens_out = max(len(text) // 4, 1)
+        with self._lock:
+            self.calls += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+        usage = SimpleNamespace(
+            prompt_token_count=tokens_in,
+            candidates_token_count=tokens_out,
+            total_token_count=tokens_in + tokens_out
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    @staticmethod
+    def _summary(idx):
+        return (
+            f"## Resumo {idx}\n"
+            "O fato principal, em dois parágrafos curtos com **destaques**.\n\n"
+            "Segundo parágrafo com o contexto da notícia.\n"
+            "### Pontos Chave\n- Primeiro ponto\n- Segundo ponto\n- Terceiro ponto\n"
+            "### Contexto\nPor que isso importa para o leitor."
+        )
+
+
+class FakeSMTPServer:
+    """
+    Servidor SMTP mínimo em 127.0.0.1 (sem TLS: use SMTP_STARTTLS=0).
+    Aceita qualquer login e guarda só o tamanho de cada mensagem.
+    'latency' (segundos) é aplicada a cada mensagem recebida (DATA).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self.bytes_received = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                self.reply("220 fake-smtp pronto")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode("ascii", "replace").strip().upper()
+                    if command.startswith(("EHLO", "HELO")):
+                        self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN LOGIN\r\n250 SIZE 104857600\r\n")
+                    elif command.startswith("AUTH"):
+                        self.reply("235 2.7.0 autenticado")
+                    elif command.startswith("DATA"):
+                        self.reply("354 pode enviar")
+                        size = 0
+                        while True:
+                            chunk = self.rfile.readline()
+                            if not chunk or chunk == b".\r\n":
+                                break
+                            size += len(chunk)
+                        if fake.latency:
+                            time.sleep(fake.latency)
+                        with fake._lock:
+                            fake.messages += 1
+                            fake.bytes_received += size
+                        self.reply("250 2.0.0 recebido")
+                    elif command.startswith("QUIT"):
+                        self.reply("221 tchau")
+                        return
+                    else:
+                        # MAIL, RCPT, RSET, NOOP...
+                        self.reply("250 ok")
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def configure_env(self):
+        """Aponta o EmailSender para este servidor."""
+        os.environ.update({
+            "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(self.port),
+            "SMTP_STARTTLS": "0",
+            "SENDER_EMAIL": os.getenv("SENDER_EMAIL") or "bench@karteiro.local",
+            "EMAIL_PASSWORD": os.getenv("EMAIL_PASSWORD") or "senha",
+        })
@@ -0,0 +1,289 @@
+# benchmarks/run_benchmarks.py
+"""
+Benchmark offline de cada etapa do pipeline, sem internet, Gemini ou Gmail:
+feeds e artigos gravados (benchmarks/fixtures) servidos por um HTTP local, Gemini falso com
+latência configurável, servidor SMTP falso e banco SQLite temporário (ou --db-url).
+
+Etapas medidas separadamente:
+  get_candidates, download_article_content, filter_candidates, summarize_article,
+  summarize_articles, generate_briefing, create_pdf, create_epub, send_pdf
+
+Uso:
+  python benchmarks/run_benchmarks.py
+  python benchmarks/run_benchmarks.py --iterations 50 --gemini-latency-ms 800 --output bench.json
+  python benchmarks/run_benchmarks.py --output novo.json --compare bench.json   # compara com outro commit
+  python benchmarks/run_benchmarks.py --only create_pdf create_epub
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import numpy as np
+
+from benchmarks.fakes import FixtureServer, FakeGeminiClient, FakeSMTPServer
+
+STAGES = [
+    "get_candidates", "download_article_content", "filter_candidates", "summarize_article",
+    "summarize_articles", "generate_briefing", "create_pdf", "create_epub", "send_pdf",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark offline por etapa do Karteiro")
+    parser.add_argument("--iterations", type=int, default=20, help="Medições por etapa (depois de 1 aquecimento)")
+    parser.add_argument("--gemini-latency-ms", type=float, default=0, help="Latência de cada chamada ao Gemini falso")
+    parser.add_argument("--gemini-jitter-ms", type=float, default=0)
+    parser.add_argument("--http-latency-ms", type=float, default=0, help="Latência de cada resposta do HTTP local")
+    parser.add_argument("--smtp-latency-ms", type=float, default=0, help="Latência de cada mensagem no SMTP falso")
+    parser.add_argument("--articles", type=int, default=2, help="Artigos por jornal (o main.py usa 2)")
+    parser.add_argument("--db-url", default=None, help="Padrão: SQLite temporário")
+    parser.add_argument("--only", nargs="+", choices=STAGES, help="Mede só estas etapas")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    parser.add_argument("--compare", help="JSON de outra execução para comparar (ex: do commit anterior)")
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def measure(fn, iterations):
+    """Roda fn(i) uma vez para aquecer e depois 'iterations' vezes. Retorna as durações (s)."""
+    fn(-1)
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings):
+    ms = np.array(timings) * 1000
+    return {
+        "n": len(timings),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "ops_per_s": float(len(timings) / (ms.sum() / 1000)) if ms.sum() else 0.0,
+    }
+
+
+def print_table(results, baseline=None):
+    header = f"{'ETAPA':<26} | {'N':>4} | {'MÉDIA':>9} | {'P50':>9} | {'P95':>9} | {'P99':>9} | {'OPS/S':>8}"
+    if baseline:
+        header += f" | {'Δ P50':>8} | {'Δ P95':>8}"
+    print(header)
+    print("-" * len(header))
+    for stage, r in results.items():
+        line = (f"{stage:<26} | {r['n']:>4} | {r['mean_ms']:>7.2f}ms | {r['p50_ms']:>7.2f}ms | "
+                f"{r['p95_ms']:>7.2f}ms | {r['p99_ms']:>7.2f}ms | {r['ops_per_s']:>8.1f}")
+        if baseline:
+            old = baseline.get(stage)
+            if old:
+                line += f" | {_delta(r['p50_ms'], old['p50_ms']):>8} | {_delta(r['p95_ms'], old['p95_ms']):>8}"
+            else:
+                line += f" | {'-':>8} | {'-':>8}"
+        print(line)
+
+
+def _delta(new, old):
+    if not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    args = parse_args()
+    stages = args.only or STAGES
+    # O benchmark roda dentro de um diretório temporário: caminhos relativos ao diretório atual
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+    started_in = os.getcwd()
+
+    workdir = tempfile.mkdtemp(prefix="karteiro-bench-")
+    # Tudo que o pipeline grava (banco, caches, PDFs, EPUBs) fica no diretório temporário
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["ARTICLE_CACHE_DIR"] = os.path.join(workdir, "cache", "articles")
+    os.environ["SUMMARY_CACHE_DIR"] = os.path.join(workdir, "cache", "summaries")
+    os.chdir(workdir)
+
+    fixtures = FixtureServer(latency=args.http_latency_ms / 1000).start()
+    smtp = FakeSMTPServer(latency=args.smtp_latency_ms / 1000).start()
+    smtp.configure_env()
+    gemini = FakeGeminiClient(args.gemini_latency_ms / 1000, args.gemini_jitter_ms / 1000, seed=42)
+
+    # Só agora: src.database lê DATABASE_URL na importação
+    from src.database import SessionLocal, engine
+    from src.models import Base, User, Source, Interest
+    from src.snapshots import load_active_users
+    from src.scraper import NewsScraper
+    from src.feed_cache import FeedCache
+    from src.article_cache import ArticleCache
+    from src.summary_cache import SummaryCache
+    from src.gemini_client import GeminiClient, RateLimiter
+    from src.ai_curator import NewsCurator, SUMMARY_PROMPT_VERSION
+    from src.pdf_generator import NewsFormatter
+    from src.epub_generator import EpubGenerator
+    from src.emailer import EmailSender
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    bench_email = "bench-etapas@karteiro.local"
+    db.query(User).filter(User.email == bench_email).delete()
+    user = User(name="Bench Etapas", email=bench_email, kindle_email="kindle@karteiro.local")
+    user.sources = [Source(name=url.rsplit("/", 1)[-1], url=url) for url in fixtures.feed_urls()]
+    user.interests = [Interest(keyword=k) for k in ("Inteligência Artificial", "Economia", "Juros", "Tecnologia")]
+    db.add(user)
+    db.commit()
+    snapshot = load_active_users(db, [user.id])[0]
+
+    # Quota "infinita": o benchmark mede o pipeline, não o limitador
+    llm = GeminiClient(client=gemini, limiter=RateLimiter(rpm=10**9, tpm=10**12), max_retries=0)
+    # Cache de resumos num diretório novo: cada medição é uma chamada de verdade ao Gemini falso
+    curator = NewsCurator(summary_cache=SummaryCache("bench", SUMMARY_PROMPT_VERSION), llm=llm)
+    formatter = NewsFormatter()
+    epub_gen = EpubGenerator()
+
+    # Dados de entrada das etapas seguintes, preparados uma vez
+    quiet = open(os.devnull, "w")
+    real_stdout = sys.stdout
+    sys.stdout = quiet
+    try:
+        scraper = NewsScraper(db, feed_cache=FeedCache(), article_cache=ArticleCache(os.path.join(workdir, "prep")))
+        candidates = scraper.get_candidates(snapshot, limit_per_source=10)
+        articles = []
+        for item in candidates[:args.articles]:
+            articles.append({**item, **scraper.download_article_content(item['url'])})
+        summaries = curator.summarize_articles(articles)
+        for art, summary in zip(articles, summaries):
+            art['ai_summary'] = summary
+        briefing = curator.generate_briefing(summaries)
+        epub_path = epub_gen.create_epub(briefing, articles, output_filename="bench.epub")
+    finally:
+        sys.stdout = real_stdout
+
+    counter = {"n": 0}
+
+    def unique():
+        counter["n"] += 1
+        return counter["n"]
+
+    def run_get_candidates(i):
+        # FeedCache novo: mede download + parse + dedup no histórico (sem cache da execução)
+        NewsScraper(db, feed_cache=FeedCache(), article_cache=scraper.article_cache).get_candidates(snapshot, limit_per_source=10)
+
+    def run_download(i):
+        # URL nova a cada medição: sem acerto no cache de artigos
+        scraper.download_article_content(f"{fixtures.base_url}/articles/economia-{1000 + unique()}.html")
+
+    def run_filter(i):
+        curator.filter_candidates(candidates, snapshot, limit=args.articles)
+
+    def fresh_articles():
+        n = unique()
+        return [{**art, 'title': f"{art['title']} #{n}"} for art in articles]
+
+    def run_summarize_article(i):
+        curator.summarize_article(fresh_articles()[0])
+
+    def run_summarize_articles(i):
+        curator.summarize_articles(fresh_articles())
+
+    def run_briefing(i):
+        curator.generate_briefing(summaries)
+
+    def run_pdf(i):
+        formatter.create_pdf(briefing, [dict(art) for art in articles], output_filename="bench.pdf")
+
+    def run_epub(i):
+        # Uma capa diferente por iteração: o EPUB de uma edição idêntica seria só reaproveitado
+        epub_gen.create_epub(f"{briefing}\n{i}", articles, output_filename="bench.epub")
+
+    emailer = EmailSender()
+
+    def run_send(i):
+        if not emailer.send_pdf(epub_path, target_email="kindle@karteiro.local"):
+            raise RuntimeError("envio falhou no SMTP falso")
+
+    runners = {
+        "get_candidates": run_get_candidates,
+        "download_article_content": run_download,
+        "filter_candidates": run_filter,
+        "summarize_article": run_summarize_article,
+        "summarize_articles": run_summarize_articles,
+        "generate_briefing": run_briefing,
+        "create_pdf": run_pdf,
+        "create_epub": run_epub,
+        "send_pdf": run_send,
+    }
+
+    print(f"⏱️ Benchmark offline: {args.iterations} medições por etapa "
+          f"(Gemini {args.gemini_latency_ms:.0f}ms, HTTP {args.http_latency_ms:.0f}ms, SMTP {args.smtp_latency_ms:.0f}ms)")
+    results = {}
+    try:
+        for stage in stages:
+            # Os prints do pipeline atrapalhariam a tabela (e custam tempo): vão para /dev/null
+            sys.stdout = quiet
+            try:
+                timings = measure(runners[stage], args.iterations)
+            finally:
+                sys.stdout = real_stdout
+            results[stage] = summarize(timings)
+            print(f"   ✅ {stage}")
+    finally:
+        emailer.close()
+        db.close()
+        fixtures.stop()
+        smtp.stop()
+        quiet.close()
+        os.chdir(started_in)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+        print(f"\n📊 Comparando com {compare}")
+    print()
+    print_table(results, baseline)
+
+    if output:
+        report = {
+            "commit": git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "params": {
+                "iterations": args.iterations,
+                "gemini_latency_ms": args.gemini_latency_ms,
+                "gemini_jitter_ms": args.gemini_jitter_ms,
+                "http_latency_ms": args.http_latency_ms,
+                "smtp_latency_ms": args.smtp_latency_ms,
+                "articles": args.articles,
+                "db": "sqlite" if not args.db_url else args.db_url.split(":", 1)[0],
+            },
+            "stages": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Resultados salvos em {output}")
+
+
+if __name__ == "__main__":
+    main()
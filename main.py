@@ -1,132 +1,320 @@
 import sys
 import os
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Garante que o Python encontre os módulos da pasta src
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.database import SessionLocal
-from src.models import User, NewsHistory
-from src.scraper import NewsScraper
-from src.ai_curator import NewsCurator
-from src.pdf_generator import NewsFormatter
-from src.epub_generator import EpubGenerator # 1. Importando o gerador de EPUB
-from src.emailer import EmailSender 
-
-def main():
+from src.snapshots import load_active_users
+from src.checkpoints import CheckpointStore
+from src.jobs import JobQueue
+from src.feed_cache import FeedCache
+from src.history import HistoryIndex, prune_history
+from src.retention import prune_run_state
+from src.article_cache import ArticleCache
+from src.summary_cache import SummaryCache
+from src.shared_requests import SharedRequests
+from src.ai_curator import SUMMARY_PROMPT_VERSION
+from src.edition import UserEdition
+from src.pipeline import StreamingPipeline
+from src.delivery import DeliveryWorker
+from src.pdf_backup import PdfBackups
+from src.epub_generator import prune_store
+from src.metrics import metrics
+from src.profiling import StageProfiler
+
+def process_user(user, shared):
+    """
+    Gera e envia o jornal de UM usuário ('user' é um UserSnapshot: fontes e interesses já carregados).
+    Roda dentro de um worker: tem sua própria sessão do banco e suas próprias ferramentas;
+    só os caches (feeds, artigos, resumos) são compartilhados entre workers.
+    Cada etapa é salva como checkpoint: uma nova execução no mesmo dia continua de onde parou.
+    Retorna o status final e a última etapa concluída, para o relatório.
+    """
+    edition = UserEdition(user, shared)
+    try:
+        return edition.build()
+    finally:
+        edition.close()
+
+def deliver_pending():
+    """Só esvazia a fila de entregas (ex: para reenviar o que falhou na última execução)."""
+    print("📮 Esvaziando a fila de entregas (incluindo as que tinham desistido)...")
+    deliveries = DeliveryWorker().drain(retry_failed=True)
+    for d in deliveries:
+        print(f"   {d['recipient']:<35} | {d['status']}" + (f" ({d['error']})" if d['error'] else ""))
+    print(f"✅ {sum(1 for d in deliveries if d['status'] == 'sent')}/{len(deliveries)} entregues.")
+
+def apply_delivery_results(results, deliveries):
+    """
+    Atualiza o status de cada usuário no relatório com o resultado da entrega. Um usuário pode ter
+    mais de um item na fila (ex: o jornal de hoje e o de uma execução anterior): um envio que deu certo
+    vale como 'enviado'; senão, uma nova tentativa agendada vale mais que uma desistência.
+    """
+    labels = {"sent": "enviado", "pending": "erro no envio (nova tentativa agendada)", "failed": "erro no envio"}
+    precedence = {"sent": 0, "pending": 1, "failed": 2}
+    best = {}
+    for d in deliveries:
+        current = best.get(d['user_id'])
+        if current is None or precedence.get(d['status'], 3) < precedence.get(current, 3):
+            best[d['user_id']] = d['status']
+    by_user = {user_id: labels.get(status, status) for user_id, status in best.items()}
+    for result in results:
+        if result['status'] == "na fila" and result['user_id'] in by_user:
+            result['status'] = by_user[result['user_id']]
+
+def run_user(user, shared):
+    """Isola as falhas: um erro inesperado em um usuário não derruba os outros."""
+    started = time.monotonic()
+    try:
+        # Tudo medido aqui dentro (etapas, chamadas ao LLM...) é atribuído a este usuário no relatório
+        with metrics.user(user.id), metrics.timer("user_total"):
+            outcome = process_user(user, shared)
+    except Exception as e:
+        print(f"❌ Erro ao processar {user.name}: {e}")
+        outcome = {"status": f"erro: {e}", "stage": last_checkpoint(user.id, shared['edition_date'])}
+    return {"user_id": user.id, "user": user.name, "seconds": time.monotonic() - started, **outcome}
+
+def last_checkpoint(user_id, edition_date):
+    """Última etapa salva de um usuário (usado quando o processamento quebrou no meio)."""
+    db = SessionLocal()
+    try:
+        return CheckpointStore(db, user_id, edition_date).last_stage
+    except Exception:
+        return None
+    finally:
+        db.close()
+
+def run_jobs(queue, workers, shared, users):
+    """
+    Modo distribuído: cada worker (thread) pega jobs da fila no Postgres até ela esvaziar.
+    Vários processos/containers podem rodar isto ao mesmo tempo sem processar o mesmo usuário duas vezes.
+    'users' são os snapshots já carregados; um job de usuário que não está ali (criado por outro
+    processo depois da carga) busca o snapshot no banco.
+    """
+    users_by_id = {user.id: user for user in users}
+
+    def worker_loop():
+        db = SessionLocal()
+        results = []
+        try:
+            while True:
+                claimed = queue.claim(db)
+                if claimed is None:
+                    # Job devolvido à fila espera o backoff: aguarda por ele em vez de desistir (ou girar)
+                    wait = queue.seconds_until_next(db)
+                    if wait is None:
+                        return results
+                    time.sleep(max(wait, 0.5))
+                    continue
+                job_id, user_id = claimed
+                user = users_by_id.get(user_id)
+                if user is None:
+                    loaded = load_active_users(db, [user_id])
+                    if not loaded:
+                        queue.complete(db, job_id, "usuário inativo")
+                        continue
+                    user = loaded[0]
+                result = run_user(user, shared)
+                if result['status'].startswith("erro"):
+                    if queue.fail(db, job_id, result['status']):
+                        result['status'] += " (job devolvido à fila)"
+                else:
+                    queue.complete(db, job_id, result['status'])
+                results.append(result)
+        finally:
+            db.close()
+
+    queue.start_heartbeat()
+    try:
+        if workers <= 1:
+            return worker_loop()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker_loop) for _ in range(workers)]
+            return [result for future in futures for result in future.result()]
+    finally:
+        queue.stop_heartbeat()
+
+def print_report(results, elapsed):
+    print(f"\n==========================================")
+    print(f"📊 Relatório da execução ({elapsed:.1f}s)")
+    print(f"==========================================")
+    for result in results:
+        stage = result.get('stage') or "-"
+        print(f"   {result['user']:<25} | {result['seconds']:>6.1f}s | etapa: {stage:<10} | {result['status']}")
+
+    sent = sum(1 for r in results if r['status'] == "enviado")
+    failed = sum(1 for r in results if r['status'].startswith("erro"))
+    print(f"   ✅ {sent} enviados | ❌ {failed} com erro | {len(results) - sent - failed} sem envio")
+
+def save_metrics(results, shared, **extra):
+    """Grava o relatório JSON da execução e o arquivo do Prometheus (com os números dos caches)."""
+    metrics.add_stats("feed", shared['feed_cache'].stats)
+    metrics.add_stats("article_cache", shared['article_cache'].stats)
+    metrics.add_stats("summary_cache", shared['summary_cache'].stats)
+    metrics.add_stats("shared_requests", shared['shared_requests'].stats)
+    if shared['history_index'] is not None:
+        metrics.add_stats("history_index", shared['history_index'].stats)
+    if shared['pdf_backups'] is not None:
+        metrics.add_stats("pdf_backup", shared['pdf_backups'].stats)
+
+    report = metrics.report(results, edition_date=shared['edition_date'], **extra)
+    try:
+        json_path = metrics.write_report(report)
+        prom_path = metrics.write_prometheus(report)
+        print(f"📈 Métricas da execução: {json_path} (Prometheus: {prom_path})")
+    except OSError as e:
+        # Métrica não pode derrubar a execução: o jornal já foi entregue
+        print(f"⚠️ Não foi possível gravar as métricas: {e}")
+
+def main(workers=1, distributed=False, profile=False, pipeline=False, pdf=True):
     print("🚀 Iniciando Karteiro 2.0 (Database Edition)...")
-    
+    started = time.monotonic()
+    metrics.reset()
+    # Profiling sob demanda (--profile ou PROFILE=1): cProfile, tracemalloc e pilhas por etapa
+    profiler = StageProfiler.from_env(enabled=profile)
+    if profiler is not None:
+        metrics.profiler = profiler.start()
+
+    # PDF de backup só depois do envio, num pool de processos (None: --no-pdf ou PDF_MODE=off)
+    pdf_backups = PdfBackups.from_env(enabled=pdf)
+
     # 1. Conecta ao Banco
     db = SessionLocal()
-    
+
     try:
-        # 2. Busca todos os usuários ativos
-        users = db.query(User).filter(User.is_active == True).all()
+        # 2. Busca todos os usuários ativos (com fontes e interesses, em 3 consultas no total)
+        users = load_active_users(db)
         print(f"👥 Usuários ativos encontrados: {len(users)}")
 
         if not users:
             print("⚠️ Nenhum usuário ativo. Rode o 'src/seed.py' se for a primeira vez.")
             return
 
-        # Instancia as ferramentas
-        scraper = NewsScraper(db)
-        curator = NewsCurator()
-        formatter = NewsFormatter()
-        epub_gen = EpubGenerator() # 2. Instanciando a classe do EPUB
-        emailer = EmailSender()
-
-        # 3. Loop por Usuário
-        for user in users:
-            print(f"\n==========================================")
-            print(f"👤 Processando jornal para: {user.name} ({user.email})")
-            print(f"==========================================")
-
-            # --- ETAPA A: Coleta ---
-            candidates = scraper.get_candidates(user, limit_per_source=4)
-            
-            if not candidates:
-                print("💤 Nenhuma notícia nova encontrada para este usuário hoje.")
-                continue
-
-            # --- ETAPA B: Curadoria (IA) ---
-            selected_articles = curator.filter_candidates(candidates, user, limit=2)
-            
-            if not selected_articles:
-                print("🧹 A IA filtrou todas as notícias (nada relevante).")
-                continue
-
-            # --- ETAPA C: Download e Resumo ---
-            processed_articles = []
-            summaries = []
-
-            print(f"📚 Baixando e resumindo {len(selected_articles)} artigos...")
-            for item in selected_articles:
-                content_data = scraper.download_article_content(item['url'])
-                
-                if content_data:
-                    full_article = {**item, **content_data}
-                    
-                    # Gera resumo com IA
-                    summary = curator.summarize_article(full_article)
-                    full_article['ai_summary'] = summary
-                    
-                    processed_articles.append(full_article)
-                    summaries.append(summary)
-
-            if not processed_articles:
-                print("❌ Falha ao processar conteúdos.")
-                continue
-
-            # --- ETAPA D: Geração dos Arquivos ---
-            briefing_text = curator.generate_briefing(summaries)
-            date_str = datetime.now().strftime('%Y-%m-%d')
-            
-            # 3. Gera a versão PDF (Salva local, mas não envia)
-            pdf_filename = f"Jornal_{user.name.split()[0]}_{date_str}.pdf"
-            pdf_path = formatter.create_pdf(
-                briefing_text, 
-                processed_articles, 
-                output_filename=pdf_filename
-            )
-            print(f"✅ PDF gerado (backup local): {pdf_path}")
-
-            # 4. Gera a versão EPUB (Para envio)
-            epub_filename = f"Jornal_{user.name.split()[0]}_{date_str}.epub"
-            epub_path = epub_gen.create_epub(
-                briefing_text, 
-                processed_articles, 
-                output_filename=epub_filename
-            )
-
-            # --- ETAPA E: Envio (Apenas EPUB) ---
-            if epub_path:
-                print(f"📤 Enviando EPUB para Kindle: {user.kindle_email}...")
-                
-                # O método chama send_pdf, mas funciona para qualquer arquivo
-                sent = emailer.send_pdf(epub_path, target_email=user.kindle_email)
-                
-                if sent:
-                    # --- ETAPA F: Atualizar Histórico ---
-                    print("💾 Salvando histórico para evitar repetições futuras...")
-                    for art in processed_articles:
-                        history_item = NewsHistory(
-                            user_id=user.id,
-                            title=art['title'],
-                            url=art['url'],
-                            published_at=art.get('published', '')
-                        )
-                        db.add(history_item)
-                    
-                    db.commit()
-                    print("✅ Ciclo concluído para este usuário!")
-                else:
-                    print("❌ Erro no envio. Histórico NÃO atualizado.")
+        # Ferramentas compartilhadas por todos os workers (todas seguras entre threads)
+        feed_cache = FeedCache(session_factory=SessionLocal) # Um download por feed, compartilhado entre usuários (com GET condicional)
+        shared = {
+            'feed_cache': feed_cache,
+            # Para históricos muito grandes: filtro de Bloom montado uma vez por execução
+            'history_index': HistoryIndex.build(db) if os.getenv("HISTORY_BLOOM") == "1" else None,
+            # Texto dos artigos em disco, compartilhado entre usuários e execuções
+            'article_cache': ArticleCache(),
+            'summary_cache': SummaryCache(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"), SUMMARY_PROMPT_VERSION),
+            # Curadoria e briefing iguais (mesmos interesses e candidatos / mesmos resumos): uma chamada só
+            'shared_requests': SharedRequests(),
+            'pdf_backups': pdf_backups,
+            # Data da edição fixada no início (uma execução que passa da meia-noite continua na mesma edição)
+            'edition_date': datetime.now().strftime('%Y-%m-%d'),
+        }
+
+        if distributed:
+            # 3. Vários processos/containers dividem os usuários pela fila de jobs no Postgres.
+            # Cada processo baixa só os feeds dos usuários que pegar.
+            queue = JobQueue(shared['edition_date'])
+            created = queue.enqueue_edition(db)
+            print(f"🗂️ Worker {queue.worker_id}: {created} jobs novos na edição {shared['edition_date']}.")
+            results = run_jobs(queue, workers, shared, users)
+            print(f"🗂️ Jobs da edição: {queue.counts(db)}")
+        elif pipeline:
+            # 3. Pipeline assíncrono: etapas em estágios com filas limitadas, sobrepostas entre usuários.
+            # Os feeds são baixados no estágio de coleta, conforme os usuários chegam.
+            results = StreamingPipeline(shared).run(users)
+        else:
+            # Baixa de uma vez (em paralelo) todos os feeds distintos de todos os usuários
+            with metrics.timer("prefetch"):
+                feed_cache.prefetch([s.url for user in users for s in user.sources])
+
+            # 3. Loop por Usuário (sequencial com 1 worker, em paralelo com mais)
+            if workers <= 1:
+                results = [run_user(user, shared) for user in users]
+            else:
+                print(f"⚙️ Processando {len(users)} usuários com {workers} workers em paralelo...")
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(lambda user: run_user(user, shared), users))
+
+        # --- ETAPA F: Entrega (fila com novas tentativas; grava o histórico de quem recebeu) ---
+        with metrics.timer("delivery"):
+            # No modo distribuído, só os jornais deste nó: o arquivo do EPUB está no disco de quem o gerou
+            own_users = {result['user_id'] for result in results} if distributed else None
+            deliveries = DeliveryWorker().drain(user_ids=own_users)
+        apply_delivery_results(results, deliveries)
+
+        # Os EPUBs já saíram: agora os PDFs de backup (em processos separados) enquanto o resto termina
+        if pdf_backups is not None:
+            pdf_backups.flush()
+
+        # Retenção: o histórico mais antigo que HISTORY_RETENTION_DAYS sai em lotes (0 = guarda tudo)
+        retention_days = int(os.getenv("HISTORY_RETENTION_DAYS", 60))
+        if retention_days > 0:
+            pruned = prune_history(db, retention_days)
+            if pruned:
+                print(f"🧹 {pruned} registros do histórico com mais de {retention_days} dias apagados.")
+        # Checkpoints, jobs e entregas resolvidas só servem para as execuções recentes
+        state_days = int(os.getenv("RUN_STATE_RETENTION_DAYS", 7))
+        if state_days > 0:
+            pruned = prune_run_state(db, state_days)
+            if any(pruned.values()):
+                print(f"🧹 Estado de execuções com mais de {state_days} dias apagado: {pruned}")
+            # E os EPUBs das edições antigas em .store (quem recebeu continua com o seu link)
+            removed = prune_store(state_days)
+            if removed:
+                print(f"🧹 {removed} EPUBs de edições com mais de {state_days} dias apagados de data/output/epubs/.store.")
+
+        if pdf_backups is not None:
+            pdf_backups.wait()
+
+        print_report(results, time.monotonic() - started)
+        feed_cache.print_stats()
+        shared['article_cache'].print_stats()
+        shared['summary_cache'].print_stats()
+        shared['shared_requests'].print_stats()
+        if pdf_backups is not None:
+            pdf_backups.print_stats()
+        save_metrics(results, shared, workers=workers, distributed=distributed, pipeline=pipeline, pdf=pdf_backups is not None)
 
     except Exception as e:
         print(f"❌ Erro fatal na execução: {e}")
     finally:
         db.close()
+        if pdf_backups is not None:
+            pdf_backups.close()
+        if profiler is not None:
+            metrics.profiler = None
+            print(f"🔬 Profiles da execução em: {profiler.stop()}")
         print("\n🏁 Execução finalizada.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Karteiro - gera e envia o jornal de cada usuário")
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WORKERS", 1)),
+        help="Quantos usuários processar em paralelo (1 = sequencial, o padrão)"
+    )
+    parser.add_argument(
+        "--deliver-only", action="store_true",
+        help="Não gera jornais: só tenta entregar o que ficou na fila de envio"
+    )
+    parser.add_argument(
+        "--distributed", action="store_true", default=os.getenv("DISTRIBUTED") == "1",
+        help="Divide os usuários com outros processos/containers pela fila de jobs do Postgres"
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true", default=os.getenv("PIPELINE") == "1",
+        help="Pipeline assíncrono: etapas em estágios com filas limitadas, sobrepostas entre usuários"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Grava cProfile, alocações de memória e pilhas (flamegraph) de cada etapa em data/output/profiles/"
+    )
+    parser.add_argument(
+        "--no-pdf", action="store_true",
+        help="Não gera o PDF de backup para ninguém (só o EPUB, que é o que vai para o Kindle)"
+    )
+    args = parser.parse_args()
+    if args.deliver_only:
+        deliver_pending()
+    else:
+        main(workers=args.workers, distributed=args.distributed, profile=args.profile, pipeline=args.pipeline, pdf=not args.no_pdf)
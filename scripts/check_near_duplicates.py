@@ -0,0 +1,69 @@
+# scripts/check_near_duplicates.py
+"""
+Confere a detecção de notícias quase duplicadas (src/dedup.py) com pares reais de
+benchmarks/fixtures/near_duplicates.json:
+  - 'duplicates': a mesma história em fontes diferentes (com títulos e resumos escritos de outro jeito)
+  - 'distinct': histórias diferentes e parecidas (mesmo assunto, mesma fonte, só os números mudam,
+    ou de fontes diferentes e sem números no título, que só a similaridade separa)
+Todos os itens passam juntos por collapse_near_duplicates(), como numa coleta de verdade.
+Cada par duplicado precisa virar um grupo só, e nenhum par distinto pode ser juntado.
+Mostra a similaridade de cada par (útil para recalibrar DEDUP_MIN_SIMILARITY). Sai com erro se algo falhar.
+
+Uso:
+  python scripts/check_near_duplicates.py
+  python scripts/check_near_duplicates.py --min-similarity 0.2
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.dedup import MIN_SIMILARITY, collapse_near_duplicates, similarity
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "near_duplicates.json")
+
+
+def key(item):
+    return item['source'], item['title']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere a detecção de quase duplicados com pares reais")
+    parser.add_argument("--min-similarity", type=float, default=MIN_SIMILARITY)
+    args = parser.parse_args()
+
+    with open(FIXTURE, encoding="utf-8") as f:
+        pairs = json.load(f)
+
+    # Cada item uma vez só (vários aparecem em um par duplicado e em um distinto)
+    items = {}
+    for kind in ("duplicates", "distinct"):
+        for a, b in pairs[kind]:
+            for item in (a, b):
+                items.setdefault(key(item), {**item, "url": f"https://exemplo.com/{len(items)}"})
+
+    kept = collapse_near_duplicates(list(items.values()), priorities=[], min_similarity=args.min_similarity)
+    # Item -> representante do grupo em que ele terminou
+    group = {}
+    for rep in kept:
+        group[key(rep)] = key(rep)
+        for merged in rep.get('merged', []):
+            group[key(merged)] = key(rep)
+
+    failures = 0
+    for kind, expected in (("duplicates", True), ("distinct", False)):
+        print(f"\n{'Mesma história' if expected else 'Histórias diferentes'} (mínimo para juntar: {args.min_similarity:.2f}):")
+        for a, b in pairs[kind]:
+            together = group[key(a)] == group[key(b)]
+            ok = together == expected
+            failures += not ok
+            print(f"   {'✅' if ok else '❌'} {similarity(a, b):.2f} | {a['title'][:45]:<45} | {b['title'][:45]}")
+
+    print(f"\n{'✅ Tudo certo' if not failures else f'❌ {failures} pares errados'} ({len(items)} notícias, {len(kept)} grupos).")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
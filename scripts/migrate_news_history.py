@@ -0,0 +1,83 @@
+# scripts/migrate_news_history.py
+"""
+Migra um news_history já existente (Postgres) para o formato compacto:
+  - nova coluna url_hash (BIGINT) preenchida em lotes, com o índice idx_user_url_hash
+  - published_at de texto para TIMESTAMP (datas ilegíveis viram NULL)
+  - índice em processed_at (retenção) e remoção do antigo idx_user_url
+
+Pode ser rodado mais de uma vez: cada passo verifica se já foi feito.
+
+Uso:
+  python scripts/migrate_news_history.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from src.database import engine
+from src.history import url_hash, parse_published
+
+BATCH_SIZE = 5000
+
+
+def columns():
+    return {col['name']: col for col in inspect(engine).get_columns("news_history")}
+
+
+def backfill(select_sql, update_sql, convert):
+    """Lê lotes de (id, valor) ainda não convertidos e grava o valor convertido."""
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(select_sql), {"limit": BATCH_SIZE}).all()
+            if not rows:
+                return total
+            conn.execute(text(update_sql), [{"row_id": row_id, "value": convert(value)} for row_id, value in rows])
+        total += len(rows)
+        print(f"   ... {total} linhas")
+
+
+def main():
+    cols = columns()
+
+    if "url_hash" not in cols:
+        print("➕ Adicionando url_hash...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE news_history ADD COLUMN url_hash BIGINT"))
+
+    print("🔢 Calculando url_hash das linhas antigas...")
+    backfill(
+        "SELECT id, url FROM news_history WHERE url_hash IS NULL LIMIT :limit",
+        "UPDATE news_history SET url_hash = :value WHERE id = :row_id",
+        url_hash
+    )
+
+    if "TIMESTAMP" not in str(cols["published_at"]["type"]).upper():
+        print("📅 Convertendo published_at para TIMESTAMP...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE news_history ADD COLUMN IF NOT EXISTS published_at_ts TIMESTAMP"))
+            conn.execute(text("ALTER TABLE news_history ADD COLUMN IF NOT EXISTS published_at_done BOOLEAN DEFAULT FALSE"))
+        backfill(
+            "SELECT id, published_at FROM news_history WHERE NOT published_at_done LIMIT :limit",
+            "UPDATE news_history SET published_at_ts = :value, published_at_done = TRUE WHERE id = :row_id",
+            parse_published
+        )
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE news_history DROP COLUMN published_at"))
+            conn.execute(text("ALTER TABLE news_history DROP COLUMN published_at_done"))
+            conn.execute(text("ALTER TABLE news_history RENAME COLUMN published_at_ts TO published_at"))
+
+    print("🗂️ Ajustando índices...")
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE news_history ALTER COLUMN url_hash SET NOT NULL"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_user_url_hash ON news_history (user_id, url_hash)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_history_processed_at ON news_history (processed_at)"))
+        conn.execute(text("DROP INDEX IF EXISTS idx_user_url"))
+
+    print("✅ news_history migrado.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# scripts/migrate_user_output_formats.py
+"""
+Adiciona users.output_formats (formatos do jornal de cada usuário) a um banco criado antes
+dessa coluna existir. Os usuários antigos ficam com 'epub,pdf', o comportamento de antes.
+Também muda a preferência de usuários já cadastrados.
+
+Pode ser rodado mais de uma vez: a coluna só é criada se ainda não existir.
+
+Uso:
+  python scripts/migrate_user_output_formats.py
+  python scripts/migrate_user_output_formats.py --formats epub --email fulano@exemplo.com
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from src.database import engine
+
+FORMATS = ("epub", "epub,pdf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coluna users.output_formats e preferência por usuário")
+    parser.add_argument("--formats", choices=FORMATS, help="'epub' (sem PDF de backup) ou 'epub,pdf'")
+    parser.add_argument("--email", action="append", default=[], help="Usuário a alterar (pode repetir)")
+    args = parser.parse_args()
+
+    cols = {col['name'] for col in inspect(engine).get_columns("users")}
+    if "output_formats" not in cols:
+        print("➕ Adicionando users.output_formats...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN output_formats VARCHAR NOT NULL DEFAULT 'epub,pdf'"))
+
+    if args.formats and args.email:
+        with engine.begin() as conn:
+            changed = conn.execute(
+                text("UPDATE users SET output_formats = :formats WHERE email = :email"),
+                [{"formats": args.formats, "email": email} for email in args.email]
+            ).rowcount
+        print(f"✏️ {changed} usuários agora com output_formats = '{args.formats}'.")
+
+    print("✅ users.output_formats pronto.")
+
+
+if __name__ == "__main__":
+    main()
@@ -48,6 +48,7 @@ def seed_data():
             name="Admin", # Nome genérico, pode mudar depois
             email=user_email,
             kindle_email=kindle_email,
+            output_formats=os.getenv("OUTPUT_FORMATS", "epub,pdf"), # 'epub' = sem PDF de backup
             is_active=True
         )
         db.add(user)
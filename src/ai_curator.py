@@ -1,30 +1,94 @@
 import sys
 import os
 import json
-from google import genai
+import hashlib
 from dotenv import load_dotenv
 
 # --- CORREÇÃO DE PATH ---
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.models import User
+from src.summary_cache import SummaryCache
+from src.shared_requests import SharedRequests
+from src.gemini_client import GeminiClient, estimate_tokens
+from src.ranking import rank_candidates
+from src.metrics import metrics
 
 load_dotenv()
 
+# Template do resumo. Qualquer mudança aqui muda SUMMARY_PROMPT_VERSION e invalida o cache de resumos.
+SUMMARY_PROMPT = """
+        Você é um analista de inteligência. Analise a notícia abaixo:
+        Título: {title}
+        Conteúdo: {content}
+
+        OBJETIVO:
+        Escreva um relatório de resumo (Deep Dive) em Português do Brasil.
+        
+        FORMATO (Markdown):
+        - Se o título original for em inglês, traduza-o.
+        - Resumo de 2 a 3 parágrafos.
+        - Lista de 3 "Pontos Chave".
+        - Seção "Contexto": Por que isso importa?
+        - Tom profissional e direto. Sem saudações.
+        """
+
+# Mesmo resumo, mas para VÁRIOS artigos numa única chamada (resposta em JSON)
+BATCH_SUMMARY_PROMPT = """
+        Você é um analista de inteligência. Analise CADA notícia da lista abaixo, separadamente.
+
+        NOTÍCIAS (JSON, cada ARTIGO tem id, título e conteúdo):
+        {articles_json}
+
+        OBJETIVO:
+        Para cada notícia, escreva um relatório de resumo (Deep Dive) em Português do Brasil.
+
+        FORMATO DE CADA RESUMO (Markdown):
+        - Se o título original for em inglês, traduza-o.
+        - Resumo de 2 a 3 parágrafos.
+        - Lista de 3 "Pontos Chave".
+        - Seção "Contexto": Por que isso importa?
+        - Tom profissional e direto. Sem saudações.
+
+        FORMATO DE RESPOSTA:
+        Retorne APENAS um objeto JSON, com um item por notícia recebida:
+        {{"summaries": [{{"id": 0, "summary": "resumo em markdown"}}]}}
+        """
+SUMMARY_PROMPT_VERSION = hashlib.sha256((SUMMARY_PROMPT + BATCH_SUMMARY_PROMPT).encode("utf-8")).hexdigest()[:12]
+
 class NewsCurator:
-    def __init__(self):
+    def __init__(self, summary_cache: SummaryCache = None, llm: GeminiClient = None,
+                 shared_requests: SharedRequests = None):
         """
         Inicializa o cliente do Gemini.
         Não precisamos mais passar 'config' aqui, pois os tópicos virão por usuário.
+        O summary_cache pode ser compartilhado entre instâncias (é o mesmo diretório em disco).
+        'llm' permite usar outro GeminiClient (ex: com um cliente falso nos benchmarks).
+        'shared_requests' (o mesmo para todos os usuários da execução) faz usuários com os mesmos
+        interesses e candidatos, ou com os mesmos resumos, dividirem uma única chamada ao Gemini.
         """
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("Erro: GEMINI_API_KEY não encontrada no .env")
-        
-        self.client = genai.Client(api_key=api_key)
+        if llm is None:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("Erro: GEMINI_API_KEY não encontrada no .env")
+            # Cliente com limite de quota (RPM/TPM) compartilhado, retries com backoff e prazo por chamada
+            llm = GeminiClient(api_key=api_key)
+
+        self.llm = llm
+        self.client = self.llm.client
         # Podemos definir o modelo padrão aqui ou no .env
         self.model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        self.summary_cache = summary_cache or SummaryCache(self.model_name, SUMMARY_PROMPT_VERSION)
+        self.shared_requests = shared_requests
+
+    def _shared(self, kind, key_parts, fn):
+        """Roda fn() uma vez por pedido canônico na execução. Retorna (resultado, veio de outro usuário)."""
+        if self.shared_requests is None:
+            return fn(), False
+        key = SharedRequests.make_key(self.model_name, *key_parts)
+        return self.shared_requests.do(kind, key, fn)
 
+    @metrics.timed("curate")
     def filter_candidates(self, candidates_list, user: User, limit=7):
         """
         Analisa as notícias baseada nos interesses do Usuário (banco de dados).
@@ -32,20 +96,55 @@ class NewsCurator:
         if not candidates_list:
             return []
 
-        print(f"🧠 IA Analisando {len(candidates_list)} manchetes para {user.name}...")
-        
         # Converte a lista de objetos 'Interest' do banco para uma lista de strings
         user_topics = [i.keyword for i in user.interests]
+
+        # Pré-ranking local (BM25): só os top K mais próximos dos interesses vão para a IA
+        ranked = rank_candidates(candidates_list, user_topics)
+
+        # Pedido canônico: os mesmos interesses (em qualquer ordem) e o mesmo conjunto de candidatos
+        # dão a mesma curadoria. A resposta guardada são URLs, que valem para os candidatos de cada usuário.
+        key_parts = (
+            "curation", limit,
+            sorted({topic.strip().casefold() for topic in user_topics}),
+            sorted((item['url'], item['title'], item['source']) for item in candidates_list),
+        )
+        try:
+            selected_urls, shared = self._shared(
+                "curadoria", key_parts, lambda: self._select_urls(ranked, user_topics, user, limit)
+            )
+        except Exception as e:
+            metrics.error("curate")
+            print(f"❌ [Erro na filtragem da IA]: {e}")
+            # Fallback: Se a IA falhar, usa o pré-ranking local (mais relevantes primeiro)
+            return ranked[:limit]
+
+        by_url = {item['url']: item for item in ranked}
+        final_selection = [by_url[url] for url in selected_urls if url in by_url]
+        if shared:
+            print(f"🤝 Curadoria reaproveitada de outro usuário com os mesmos interesses ({len(final_selection)} notícias).")
+        else:
+            print(f"🎯 IA selecionou {len(final_selection)} notícias relevantes.")
+        return final_selection
+
+    def _select_urls(self, ranked, user_topics, user, limit):
+        """Uma chamada de curadoria ao Gemini. Retorna as URLs escolhidas (erros sobem para o chamador)."""
+        print(f"🧠 IA Analisando {len(ranked)} manchetes para {user.name}...")
         topics_str = ", ".join(user_topics)
-        
+
         if not user_topics:
             print("⚠️ Usuário sem tópicos definidos. Usando genéricos.")
             topics_str = "Notícias Importantes, Tecnologia, Ciência, Economia"
 
-        # Prepara a lista para o prompt
+        top_k = int(os.getenv("CURATOR_PRERANK_TOP_K", 40))
+        shortlist = ranked[:max(top_k, limit)]
+        if len(shortlist) < len(ranked):
+            print(f"   📉 Pré-ranking local: {len(shortlist)} de {len(ranked)} manchetes enviadas à IA.")
+
+        # Prepara a lista para o prompt (IDs curtos: a posição na shortlist, em vez do UUID)
         candidates_text = ""
-        for item in candidates_list:
-            candidates_text += f"ID: {item['id']} | Título: {item['title']} | Fonte: {item['source']}\n"
+        for idx, item in enumerate(shortlist):
+            candidates_text += f"ID: {idx} | Título: {item['title']} | Fonte: {item['source']}\n"
 
         prompt = f"""
         Você é um editor chefe pessoal. Seu usuário tem interesse nestes tópicos: {topics_str}.
@@ -58,66 +157,176 @@ class NewsCurator:
         {candidates_text}
         
         FORMATO DE RESPOSTA:
-        Retorne APENAS uma lista JSON (Array de Strings) com os IDs das notícias escolhidas.
-        Exemplo: ["id_1", "id_2", "id_5"]
+        Retorne APENAS uma lista JSON (Array de Números) com os IDs das notícias escolhidas.
+        Exemplo: [1, 2, 5]
+        """
+
+        # Chamada à API (JSON Mode)
+        response = self.llm.generate(
+            model=self.model_name,
+            contents=prompt,
+            config={'response_mime_type': 'application/json'}
+        )
+
+        selected_ids = json.loads(response.text)
+
+        # Validação e correção caso a IA retorne dict em vez de list
+        if isinstance(selected_ids, dict):
+            for val in selected_ids.values():
+                if isinstance(val, list):
+                    selected_ids = val
+                    break
+
+        if not isinstance(selected_ids, list):
+            selected_ids = []
+
+        # Converte os IDs (posições na shortlist) de volta para os candidatos, sem repetir
+        selected_idx = []
+        for value in selected_ids:
+            try:
+                idx = int(value)
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < len(shortlist) and idx not in selected_idx:
+                selected_idx.append(idx)
+        return [shortlist[idx]['url'] for idx in selected_idx[:limit]]
+
+    @metrics.timed("summarize")
+    def summarize_article(self, article_data):
+        # O resumo não depende do usuário: o mesmo artigo reaproveita o resumo do cache.
+        # Se a IA falhar, retorna None (o texto do erro não pode virar resumo nem ser salvo como checkpoint)
+        title = article_data['title']
+        content = article_data['content'][:10000]
+
+        cached = self.summary_cache.get(title, content)
+        if cached is not None:
+            print(f"♻️ Resumo do cache: {title}...")
+            return cached
+        return self._summarize_uncached(title, content)
+
+    def _summarize_uncached(self, title, content):
+        """Uma chamada ao Gemini para um artigo (quem chama já olhou o cache). Retorna None se falhar."""
+        print(f"🤔 Resumindo: {title}...")
+        prompt = SUMMARY_PROMPT.format(title=title, content=content)
+        try:
+            response = self.llm.generate(model=self.model_name, contents=prompt)
+            self.summary_cache.set(title, content, response.text)
+            return response.text
+        except Exception as e:
+            metrics.error("summarize")
+            # Erros não vão para o cache: na próxima vez tentamos de novo
+            print(f"❌ [Erro no resumo] {title}: {e}")
+            return None
+
+    @metrics.timed("summarize")
+    def summarize_articles(self, articles, token_budget=None, max_batch_size=None):
+        """
+        Resume vários artigos com poucas chamadas: os que não estão no cache são agrupados
+        em lotes (limitados por um orçamento de tokens) e cada lote vira UMA requisição JSON.
+        Resumos faltando ou inválidos na resposta caem para uma chamada individual por artigo.
+        Retorna os resumos na mesma ordem de 'articles' (None onde a IA falhou).
         """
+        token_budget = token_budget or int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", 24000))
+        max_batch_size = max_batch_size or int(os.getenv("SUMMARY_BATCH_MAX", 8))
+
+        summaries = [None] * len(articles)
+        pending = []
+        for idx, art in enumerate(articles):
+            cached = self.summary_cache.get(art['title'], art['content'][:10000])
+            if cached is not None:
+                print(f"♻️ Resumo do cache: {art['title']}...")
+                summaries[idx] = cached
+            else:
+                pending.append(idx)
+
+        for batch in self._pack_batches(articles, pending, token_budget, max_batch_size):
+            if len(batch) == 1:
+                art = articles[batch[0]]
+                summaries[batch[0]] = self._summarize_uncached(art['title'], art['content'][:10000])
+                continue
+
+            results = self._summarize_batch([articles[idx] for idx in batch])
+            for pos, idx in enumerate(batch):
+                if pos in results:
+                    summaries[idx] = results[pos]
+                else:
+                    # Resposta parcial/malformada: tenta este artigo sozinho (o cache já foi consultado acima)
+                    art = articles[idx]
+                    summaries[idx] = self._summarize_uncached(art['title'], art['content'][:10000])
+
+        return summaries
+
+    @staticmethod
+    def _pack_batches(articles, indexes, token_budget, max_batch_size):
+        batch, batch_tokens = [], 0
+        for idx in indexes:
+            art = articles[idx]
+            # Entrada + saída esperada (~1 resumo de 2-3 parágrafos)
+            tokens = estimate_tokens(art['title']) + estimate_tokens(art['content'][:10000]) + 800
+            if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_batch_size):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(idx)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _summarize_batch(self, batch_articles):
+        """Uma chamada para o lote. Retorna {posição no lote: resumo} só com os itens válidos."""
+        print(f"🤔 Resumindo {len(batch_articles)} artigos numa única chamada...")
+        payload = [
+            {"id": pos, "title": art['title'], "content": art['content'][:10000]}
+            for pos, art in enumerate(batch_articles)
+        ]
+        prompt = BATCH_SUMMARY_PROMPT.format(articles_json=json.dumps(payload, ensure_ascii=False))
 
         try:
-            # Chamada à API (JSON Mode)
-            response = self.client.models.generate_content(
+            response = self.llm.generate(
                 model=self.model_name,
                 contents=prompt,
                 config={'response_mime_type': 'application/json'}
             )
-            
-            selected_ids = json.loads(response.text)
-            
-            # Validação e correção caso a IA retorne dict em vez de list
-            if isinstance(selected_ids, dict):
-                for val in selected_ids.values():
-                    if isinstance(val, list):
-                        selected_ids = val
-                        break
-            
-            if not isinstance(selected_ids, list):
-                selected_ids = []
-
-            # Filtra a lista original mantendo apenas os escolhidos
-            final_selection = [item for item in candidates_list if item['id'] in selected_ids]
-            
-            print(f"🎯 IA selecionou {len(final_selection)} notícias relevantes.")
-            return final_selection
-
+            data = json.loads(response.text)
         except Exception as e:
-            print(f"❌ [Erro na filtragem da IA]: {e}")
-            # Fallback: Se a IA falhar, retorna os primeiros itens para não ficar sem jornal
-            return candidates_list[:limit]
+            metrics.error("summarize")
+            print(f"❌ [Erro no resumo em lote]: {e}")
+            return {}
 
-    def summarize_article(self, article_data):
-        # Mantemos igual, pois o resumo depende mais do conteúdo da notícia
-        print(f"🤔 Resumindo: {article_data['title']}...")
-        prompt = f"""
-        Você é um analista de inteligência. Analise a notícia abaixo:
-        Título: {article_data['title']}
-        Conteúdo: {article_data['content'][:10000]}
+        items = data.get('summaries', []) if isinstance(data, dict) else data
+        results = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            # O modelo às vezes devolve o id como texto ("0"): vale igual, desde que seja uma posição do lote
+            try:
+                pos = int(item.get('id'))
+            except (TypeError, ValueError):
+                continue
+            summary = item.get('summary')
+            if 0 <= pos < len(batch_articles) and pos not in results and isinstance(summary, str) and summary.strip():
+                results[pos] = summary
+                art = batch_articles[pos]
+                self.summary_cache.set(art['title'], art['content'][:10000], summary)
 
-        OBJETIVO:
-        Escreva um relatório de resumo (Deep Dive) em Português do Brasil.
-        
-        FORMATO (Markdown):
-        - Se o título original for em inglês, traduza-o.
-        - Resumo de 2 a 3 parágrafos.
-        - Lista de 3 "Pontos Chave".
-        - Seção "Contexto": Por que isso importa?
-        - Tom profissional e direto. Sem saudações.
-        """
+        return results
+
+    @metrics.timed("briefing")
+    def generate_briefing(self, summaries_list):
+        # Mesmo conjunto de resumos (em qualquer ordem) = mesma capa: uma chamada por conjunto na execução.
+        # Se a IA falhar, retorna None
         try:
-            response = self.client.models.generate_content(model=self.model_name, contents=prompt)
-            return response.text
+            briefing, shared = self._shared(
+                "briefing", ("briefing", sorted(summaries_list)), lambda: self._write_briefing(summaries_list)
+            )
         except Exception as e:
-            return f"## {article_data['title']}\n\nErro ao gerar resumo: {e}"
+            metrics.error("briefing")
+            print(f"❌ [Erro no briefing]: {e}")
+            return None
+        if shared:
+            print("🤝 Briefing reaproveitado de outro usuário com os mesmos resumos.")
+        return briefing
 
-    def generate_briefing(self, summaries_list):
+    def _write_briefing(self, summaries_list):
         # Mantemos igual (Capa do jornal)
         print("📝 Escrevendo Editorial (Briefing)...")
         combined_text = "\n---\n".join(summaries_list)
@@ -138,11 +347,8 @@ class NewsCurator:
         
         Seja conciso.
         """
-        try:
-            response = self.client.models.generate_content(model=self.model_name, contents=prompt)
-            return response.text
-        except:
-            return "# Briefing\nErro ao gerar briefing."
+        response = self.llm.generate(model=self.model_name, contents=prompt)
+        return response.text
 
 # --- TESTE ISOLADO ---
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.disk_cache import DiskCache
+
+# Parâmetros de rastreamento que não mudam o conteúdo da página
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "guccounter", "cmpid"}
+
+
+def canonical_article_url(url):
+    """
+    URL canônica do artigo: mesmo texto => mesma chave, não importa de qual feed veio o link.
+    Ex: 'https://TechCrunch.com/2025/x/?utm_source=rss#comments' -> 'https://techcrunch.com/2025/x/'
+    """
+    parts = urlsplit(url.strip())
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((
+        (parts.scheme or "http").lower(),
+        parts.netloc.lower(),
+        parts.path or "/",
+        urlencode(sorted(query)),
+        "",
+    ))
+
+
+class ArticleCache:
+    """
+    Guarda o texto extraído pelo Newspaper3k (content, image_url, authors) por URL canônica.
+    Compartilhado entre usuários e entre execuções: o mesmo artigo só é baixado uma vez até o TTL vencer.
+    get_or_load() é single-flight, como o FeedCache: se dois workers pedem o mesmo artigo ao mesmo tempo,
+    só um baixa e o outro espera aquele download.
+    """
+
+    def __init__(self, directory=None, ttl_hours=None, max_mb=None):
+        directory = directory or os.getenv("ARTICLE_CACHE_DIR", os.path.join("data", "cache", "articles"))
+        ttl_hours = ttl_hours or float(os.getenv("ARTICLE_CACHE_TTL_HOURS", 72))
+        max_mb = max_mb or float(os.getenv("ARTICLE_CACHE_MAX_MB", 200))
+        self.store = DiskCache(directory, ttl_seconds=ttl_hours * 3600, max_bytes=int(max_mb * 1024 * 1024))
+        # URL canônica -> {"event", "result", "error"} do download em andamento
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    @property
+    def stats(self):
+        return {**self.store.stats, "shared": self.shared}
+
+    def get(self, url):
+        return self.store.get(canonical_article_url(url))
+
+    def get_or_load(self, url, load):
+        """
+        O artigo do cache ou, se não estiver lá, o resultado de load() (que vai para o cache).
+        Quem pede um artigo que outro worker já está buscando espera por ele (e recebe o mesmo erro, se falhar).
+        """
+        key = canonical_article_url(url)
+        with self._lock:
+            flight = self._loading.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._loading[key] = {"event": threading.Event(), "result": None, "error": None}
+
+        if not owner:
+            flight["event"].wait()
+            with self._lock:
+                self.shared += 1
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["result"]
+
+        try:
+            cached = self.store.get(key)
+            if cached is None:
+                cached = load()
+                self.set(url, cached)
+            flight["result"] = cached
+            return cached
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key)
+            flight["event"].set()
+
+    def set(self, url, article_data):
+        self.store.set(canonical_article_url(url), {
+            "content": article_data["content"],
+            "image_url": article_data.get("image_url"),
+            "authors": list(article_data.get("authors") or []),
+        })
+
+    def print_stats(self):
+        print(
+            f"🗄️ Artigos: {self.stats['hits']} do cache, {self.stats['misses']} baixados "
+            f"({self.stats['evictions']} removidos por espaço, {self.stats['shared']} esperaram o download de outro usuário)."
+        )
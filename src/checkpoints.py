@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session
+from src.models import PipelineCheckpoint
+
+# Etapas do pipeline por usuário, na ordem em que acontecem
+STAGES = ["candidates", "selection", "articles", "briefing", "render", "enqueue"]
+
+
+class CheckpointStore:
+    """
+    Guarda no Postgres o resultado de cada etapa de UM usuário em UMA edição (data).
+    run(etapa, função) devolve o resultado salvo se a etapa já foi concluída;
+    senão executa a função e salva o resultado. Assim uma nova execução no mesmo dia
+    continua de onde parou, sem baixar de novo nem chamar o Gemini de novo.
+    """
+
+    def __init__(self, db: Session, user_id, edition_date):
+        self.db = db
+        self.user_id = user_id
+        self.edition_date = edition_date
+
+        rows = db.query(PipelineCheckpoint).filter(
+            PipelineCheckpoint.user_id == user_id,
+            PipelineCheckpoint.edition_date == edition_date
+        ).all()
+        self._payloads = {row.stage: json.loads(row.payload) for row in rows}
+
+    def run(self, stage, fn):
+        if stage in self._payloads:
+            print(f"♻️ Etapa '{stage}' já concluída hoje: reaproveitando.")
+            return self._payloads[stage]
+
+        payload = fn()
+        # Resultado vazio não é salvo: numa nova execução vale a pena tentar de novo
+        if payload:
+            self.save(stage, payload)
+        return payload
+
+    def get(self, stage):
+        """O resultado salvo de uma etapa, ou None se ela ainda não foi concluída."""
+        return self._payloads.get(stage)
+
+    def save(self, stage, payload):
+        self.db.add(PipelineCheckpoint(
+            user_id=self.user_id,
+            edition_date=self.edition_date,
+            stage=stage,
+            payload=json.dumps(payload, ensure_ascii=False, default=str)
+        ))
+        self.db.commit()
+        self._payloads[stage] = payload
+
+    def discard(self, stage):
+        """Invalida uma etapa (ex: o arquivo gerado sumiu do disco)."""
+        self.db.query(PipelineCheckpoint).filter(
+            PipelineCheckpoint.user_id == self.user_id,
+            PipelineCheckpoint.edition_date == self.edition_date,
+            PipelineCheckpoint.stage == stage
+        ).delete()
+        self.db.commit()
+        self._payloads.pop(stage, None)
+
+    @property
+    def last_stage(self):
+        """A última etapa concluída (ou None se nenhuma)."""
+        done = [stage for stage in STAGES if stage in self._payloads]
+        return done[-1] if done else None
@@ -13,7 +13,8 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "karteiro_db")
 
 # URL de Conexão (Formato exigido pelo SQLAlchemy)
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL completa (ex: sqlite:///bench.db) tem prioridade sobre as variáveis acima
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # Cria o "motor" da conexão
 engine = create_engine(DATABASE_URL)
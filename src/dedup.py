@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ranking import tokenize
+
+# Similaridade (Jaccard) mínima entre os termos de duas notícias para serem a mesma história.
+# Calibrada com pares reais de benchmarks/fixtures/near_duplicates.json (scripts/check_near_duplicates.py):
+# a mesma história em fontes diferentes ficou em 0,22 ou mais; histórias diferentes de fontes diferentes e sem números
+# no título, em 0,18 ou menos (Nvidia/Microsoft chega a 0,20, mas os números do título separam).
+MIN_SIMILARITY = float(os.getenv("DEDUP_MIN_SIMILARITY", 0.2))
+# Termos do resumo do feed que entram na comparação (o começo do resumo é o lide)
+SUMMARY_TERMS = 40
+# Prefixo dos termos: junta variações que o stem de 6 letras separa (eleva/elevação, juros/juro)
+TERM_PREFIX = 4
+# Termo presente em mais notícias do que isso não gera pares para comparar: não diz nada sobre
+# ser a mesma história e, com milhares de candidatos, deixaria o índice invertido quadrático
+MAX_POSTINGS = 32
+
+
+def _terms(candidate):
+    """Conjunto de termos do título e do começo do resumo do feed."""
+    tokens = tokenize(candidate['title']) + tokenize(candidate.get('summary', '') or '')[:SUMMARY_TERMS]
+    return {token[:TERM_PREFIX] for token in tokens}
+
+
+def _title_numbers(candidate):
+    """Números do título, com decimais ("7,8", "0,44")."""
+    return set(re.findall(r"\d+(?:[.,]\d+)*", re.sub(r"<[^>]+>", " ", candidate['title'])))
+
+
+def _compatible(a, b):
+    """
+    Regras que separam histórias parecidas mas diferentes, antes de olhar a similaridade:
+    - mesma fonte: um feed não publica a mesma história duas vezes (mas publica a 'Selic' de cada mês)
+    - números do título: os de um título precisam estar no outro ("Selic 15%" e "Selic 14,75%" são diferentes)
+    """
+    if a['source'].lower() == b['source'].lower():
+        return False
+    numbers_a, numbers_b = _title_numbers(a), _title_numbers(b)
+    fewer, more = sorted((numbers_a, numbers_b), key=len)
+    return fewer <= more
+
+
+def similarity(a, b):
+    """Jaccard entre os termos de duas notícias (0 = nada em comum, 1 = os mesmos termos)."""
+    terms_a, terms_b = _terms(a), _terms(b)
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+def _priority_index(priorities):
+    """Nome da fonte -> posição na lista de prioridades (menor = preferida)."""
+    if priorities is None:
+        priorities = [p.strip() for p in os.getenv("SOURCE_PRIORITIES", "").split(",") if p.strip()]
+    return {name.lower(): rank for rank, name in enumerate(priorities)}
+
+
+def collapse_near_duplicates(candidates, priorities=None, min_similarity=None):
+    """
+    Agrupa notícias quase iguais (mesma história em fontes diferentes) pela similaridade de Jaccard
+    dos termos do título e do resumo, e mantém só um representante por grupo, preferindo as fontes
+    de 'priorities' (ou da variável SOURCE_PRIORITIES). O representante ganha a chave 'merged'
+    com as notícias que foram absorvidas.
+    Um grupo tem no máximo uma notícia de cada fonte, e todos os pares do grupo precisam passar por
+    _compatible(): uma notícia parecida com duas histórias diferentes não junta as duas.
+    """
+    if len(candidates) < 2:
+        return list(candidates)
+
+    min_similarity = MIN_SIMILARITY if min_similarity is None else min_similarity
+    terms = [_terms(c) for c in candidates]
+
+    document_freq = {}
+    for candidate_terms in terms:
+        for term in candidate_terms:
+            document_freq[term] = document_freq.get(term, 0) + 1
+    # Termos frequentes demais ficam fora do índice; só entram no Jaccard exato dos pares gerados
+    frequent = [sum(1 for term in t if document_freq[term] > MAX_POSTINGS) for t in terms]
+
+    # Índice invertido termo -> candidatos: só compara pares com algum termo raro em comum (evita O(n²))
+    pairs = []
+    postings = {}
+    for j, candidate_terms in enumerate(terms):
+        shared = {}
+        for term in candidate_terms:
+            if document_freq[term] > MAX_POSTINGS:
+                continue
+            for i in postings.get(term, ()):
+                shared[i] = shared.get(i, 0) + 1
+            postings.setdefault(term, []).append(j)
+
+        for i, rare_common in shared.items():
+            # Limite superior do Jaccard (todos os termos frequentes em comum): descarta sem calcular
+            best_case = (rare_common + min(frequent[i], frequent[j])) / max(len(terms[i]), len(candidate_terms))
+            if best_case < min_similarity:
+                continue
+            common = len(terms[i] & candidate_terms)
+            jaccard = common / (len(terms[i]) + len(candidate_terms) - common)
+            if jaccard >= min_similarity:
+                pairs.append((-jaccard, i, j))
+
+    # Union-Find, dos pares mais parecidos para os menos
+    parent = list(range(len(candidates)))
+    members = {idx: [idx] for idx in range(len(candidates))}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for _, i, j in sorted(pairs):
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        if not all(_compatible(candidates[a], candidates[b]) for a in members[root_i] for b in members[root_j]):
+            continue
+        parent[root_j] = root_i
+        members[root_i].extend(members.pop(root_j))
+
+    clusters = {find(idx): group for idx, group in members.items()}
+
+    ranks = _priority_index(priorities)
+    unranked = len(ranks)
+    kept = []
+    merged_count = 0
+    for members_idx in clusters.values():
+        # Fonte preferida primeiro; empate fica com a que apareceu antes
+        best = min(members_idx, key=lambda i: (ranks.get(candidates[i]['source'].lower(), unranked), i))
+        representative = dict(candidates[best])
+        others = [candidates[i] for i in sorted(members_idx) if i != best]
+        if others:
+            representative['merged'] = [
+                {"title": c['title'], "source": c['source'], "url": c['url']} for c in others
+            ]
+            merged_count += len(others)
+            print(f"   🔗 [{representative['source']}] {representative['title'][:40]}... absorveu {len(others)} similar(es)")
+        kept.append((best, representative))
+
+    if merged_count:
+        print(f"   🧬 {merged_count} notícias quase duplicadas removidas antes da curadoria.")
+
+    # Mantém a ordem original dos representantes
+    return [rep for _, rep in sorted(kept, key=lambda item: item[0])]
@@ -0,0 +1,269 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session
+from src.database import SessionLocal
+from src.models import DeliveryOutbox
+from src.history import write_history
+from src.emailer import EmailSender
+
+
+def enqueue_delivery(db: Session, user_id, file_path, recipient, articles):
+    """
+    Coloca o arquivo na fila de entregas. 'articles' são os artigos do jornal
+    (e os quase duplicados absorvidos), gravados no histórico só quando o envio der certo.
+    """
+    history_items = []
+    for art in articles:
+        for item in [art] + art.get('merged', []):
+            history_items.append({
+                "title": item['title'],
+                "url": item['url'],
+                "published": art.get('published', '')
+            })
+
+    outbox_item = DeliveryOutbox(
+        user_id=user_id,
+        file_path=file_path,
+        recipient=recipient,
+        articles_json=json.dumps(history_items, ensure_ascii=False)
+    )
+    db.add(outbox_item)
+    db.commit()
+    return outbox_item
+
+
+class DeliveryWorker:
+    """
+    Esvazia a fila de entregas:
+    - envia em paralelo ('concurrency' conexões SMTP, uma por thread, reaproveitadas)
+    - em caso de erro, agenda nova tentativa com backoff exponencial (até max_attempts)
+    - cada drain tenta um item no máximo attempts_per_run vezes: o resto das tentativas fica 'pending'
+      para as próximas execuções, em vez de segurar esta execução dormindo pelo backoff inteiro
+    - grava o NewsHistory na mesma transação que marca o item como enviado
+    Um item 'failed' (esgotou max_attempts) volta para a fila com requeue_failed()
+    (main.py --deliver-only, ou rodar de novo a mesma edição).
+    """
+
+    def __init__(self, concurrency=None, max_attempts=None, base_delay=None, max_delay=None, attempts_per_run=None):
+        self.concurrency = concurrency or int(os.getenv("DELIVERY_CONCURRENCY", 4))
+        self.max_attempts = max_attempts or int(os.getenv("DELIVERY_MAX_ATTEMPTS", 5))
+        self.attempts_per_run = attempts_per_run or int(os.getenv("DELIVERY_ATTEMPTS_PER_RUN", 2))
+        self.base_delay = base_delay or float(os.getenv("DELIVERY_BASE_DELAY", 30))
+        self.max_delay = max_delay or float(os.getenv("DELIVERY_MAX_DELAY", 3600))
+        # Um item preso em 'sending' por mais que isso (processo morreu no meio) volta para a fila
+        self.stale_after = timedelta(minutes=15)
+
+        self._local = threading.local()
+        self._emailers = []
+        self._emailers_lock = threading.Lock()
+        self._pool = None
+
+    def _emailer(self):
+        if not hasattr(self._local, "emailer"):
+            self._local.emailer = EmailSender()
+            with self._emailers_lock:
+                self._emailers.append(self._local.emailer)
+        return self._local.emailer
+
+    def _get_pool(self):
+        # O mesmo pool (as mesmas threads) até o close(): cada thread mantém sua conexão SMTP
+        with self._emailers_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+            return self._pool
+
+    def close(self):
+        """Encerra as threads de envio e as conexões SMTP."""
+        with self._emailers_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        with self._emailers_lock:
+            for emailer in self._emailers:
+                emailer.close()
+            self._emailers = []
+        self._local = threading.local()
+
+    def _send_batch(self, batch):
+        """
+        Roda numa thread do pool: envia um lote [(outbox_id, arquivo, destinatário)] pela conexão SMTP
+        desta thread (EmailSender.send_many). Retorna {outbox_id: (enviado, erro)}.
+        """
+        outcomes = {}
+        deliveries = []
+        for outbox_id, file_path, recipient in batch:
+            if os.path.exists(file_path):
+                deliveries.append((outbox_id, file_path, recipient))
+            else:
+                outcomes[outbox_id] = (False, f"arquivo não encontrado: {file_path}")
+        if deliveries:
+            try:
+                results = self._emailer().send_many([(path, recipient) for _, path, recipient in deliveries])
+                for (outbox_id, _, _), result in zip(deliveries, results):
+                    outcomes[outbox_id] = (result["sent"], result["error"])
+            except Exception as e:
+                for outbox_id, _, _ in deliveries:
+                    outcomes[outbox_id] = (False, str(e))
+        return outcomes
+
+    def drain(self, max_seconds=None, retry_failed=False, user_ids=None):
+        """
+        Envia tudo que estiver pendente (ou só os itens destes 'user_ids': no modo distribuído cada nó
+        entrega os jornais que ele mesmo gerou, porque o arquivo só existe no disco dele). Se sobrarem itens aguardando nova tentativa (e que ainda não
+        usaram as attempts_per_run tentativas desta execução), espera por eles até 'max_seconds'
+        (DELIVERY_DRAIN_SECONDS); o resto fica 'pending' para a próxima execução.
+        retry_failed=True devolve antes para a fila os itens que tinham desistido ('failed').
+        Retorna a lista de resultados (o último de cada item): {outbox_id, user_id, recipient, status, error}.
+        """
+        max_seconds = max_seconds if max_seconds is not None else float(os.getenv("DELIVERY_DRAIN_SECONDS", 120))
+        deadline = time.monotonic() + max_seconds
+        results = {}
+        tries = {}
+        scope = []
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            if not user_ids:
+                return []
+            scope.append(DeliveryOutbox.user_id.in_(user_ids))
+
+        db = SessionLocal()
+        pool = self._get_pool()
+        try:
+            self._release_stale(db)
+            if retry_failed:
+                requeued = self.requeue_failed(db, *scope)
+                if requeued:
+                    print(f"🔁 {requeued} entregas que tinham desistido voltaram para a fila.")
+            while True:
+                # Itens que já usaram as tentativas desta execução ficam para a próxima
+                done = [outbox_id for outbox_id, count in tries.items() if count >= self.attempts_per_run]
+                criteria = scope + ([DeliveryOutbox.id.notin_(done)] if done else [])
+
+                batch = self._claim_due(db, *criteria)
+                if batch:
+                    for result in self._deliver(db, pool, batch):
+                        tries[result['outbox_id']] = tries.get(result['outbox_id'], 0) + 1
+                        results[result['outbox_id']] = result
+                    continue
+
+                wait = self._seconds_until_next(db, *criteria)
+                if wait is None or time.monotonic() + wait > deadline:
+                    break
+                print(f"⏳ Aguardando {wait:.0f}s pela próxima tentativa de entrega...")
+                time.sleep(wait)
+        finally:
+            db.close()
+            self.close()
+
+        return list(results.values())
+
+    @staticmethod
+    def requeue_failed(db, *criteria):
+        """Devolve para a fila (com as tentativas zeradas) os itens 'failed'. Retorna quantos."""
+        count = db.query(DeliveryOutbox).filter(DeliveryOutbox.status == "failed", *criteria).update(
+            {"status": "pending", "attempts": 0, "next_attempt_at": datetime.now(), "locked_at": None},
+            synchronize_session="fetch"
+        )
+        db.commit()
+        return count
+
+    def deliver_now(self, outbox_ids):
+        """
+        Envia já estes itens da fila, sem esperar pelo drain (ex: o pipeline assíncrono entrega cada
+        jornal assim que ele fica pronto). Uma tentativa só: o que falhar fica agendado para o drain.
+        As conexões SMTP ficam abertas entre as chamadas; chame close() no fim.
+        """
+        db = SessionLocal()
+        try:
+            batch = self._claim_due(db, DeliveryOutbox.id.in_(list(outbox_ids)))
+            return self._deliver(db, self._get_pool(), batch) if batch else []
+        finally:
+            db.close()
+
+    def _release_stale(self, db):
+        cutoff = datetime.now() - self.stale_after
+        db.query(DeliveryOutbox).filter(
+            DeliveryOutbox.status == "sending",
+            DeliveryOutbox.locked_at < cutoff
+        ).update({"status": "pending"})
+        db.commit()
+
+    def _claim_due(self, db, *criteria):
+        # SKIP LOCKED: vários processos podem esvaziar a fila ao mesmo tempo sem enviar o mesmo item duas vezes
+        items = db.query(DeliveryOutbox).filter(
+            DeliveryOutbox.status == "pending",
+            DeliveryOutbox.next_attempt_at <= datetime.now(),
+            *criteria
+        ).order_by(DeliveryOutbox.next_attempt_at).limit(self.concurrency * 4).with_for_update(skip_locked=True).all()
+
+        claimed = []
+        for item in items:
+            item.status = "sending"
+            item.locked_at = datetime.now()
+            # Cópia dos dados antes do commit, que expira os objetos do ORM (lê-los depois custaria um SELECT cada)
+            claimed.append((item.id, item.user_id, item.file_path, item.recipient, item.attempts, item.articles_json))
+        db.commit()
+        return claimed
+
+    def _seconds_until_next(self, db, *criteria):
+        item = db.query(DeliveryOutbox).filter(
+            DeliveryOutbox.status == "pending",
+            *criteria
+        ).order_by(DeliveryOutbox.next_attempt_at).first()
+        if item is None:
+            return None
+        return max((item.next_attempt_at - datetime.now()).total_seconds(), 0)
+
+    def _deliver(self, db, pool, items):
+        print(f"📤 Entregando {len(items)} arquivos da fila...")
+        # Um lote por conexão SMTP (thread); 'items' são as tuplas de _claim_due
+        plain = [(outbox_id, file_path, recipient) for outbox_id, _, file_path, recipient, _, _ in items]
+        batches = [plain[i::self.concurrency] for i in range(min(self.concurrency, len(plain)))]
+        outcomes = {}
+        for batch_outcomes in pool.map(self._send_batch, batches):
+            outcomes.update(batch_outcomes)
+
+        results = []
+        for outbox_id, user_id, _, recipient, attempts, articles_json in items:
+            sent, error = outcomes[outbox_id]
+            attempts += 1
+            changes = {"attempts": attempts, "locked_at": None, "last_error": error}
+            if sent:
+                changes.update(status="sent", sent_at=datetime.now(), last_error=None)
+                self._write_history(db, user_id, recipient, articles_json)
+            elif attempts >= self.max_attempts:
+                changes["status"] = "failed"
+                print(f"❌ Entrega para {recipient} desistida após {attempts} tentativas: {error}")
+            else:
+                delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+                changes.update(
+                    status="pending",
+                    next_attempt_at=datetime.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+                )
+                print(f"🔁 Entrega para {recipient} falhou ({error}). Nova tentativa em ~{delay:.0f}s.")
+
+            db.query(DeliveryOutbox).filter(DeliveryOutbox.id == outbox_id).update(changes, synchronize_session=False)
+            # Commit por item: histórico e status 'sent' entram juntos (ou nenhum dos dois)
+            db.commit()
+            results.append({
+                "outbox_id": outbox_id,
+                "user_id": user_id,
+                "recipient": recipient,
+                "status": changes["status"],
+                "error": changes["last_error"]
+            })
+        return results
+
+    @staticmethod
+    def _write_history(db, user_id, recipient, articles_json):
+        print(f"💾 Salvando histórico de {recipient} para evitar repetições futuras...")
+        write_history(db, user_id, json.loads(articles_json))
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+
+class DiskCache:
+    """
+    Cache chave -> JSON em disco, comprimido com zlib.
+    - Cada chave vira um arquivo com nome = sha256(chave)
+    - ttl_seconds: itens mais velhos que isso são ignorados e apagados
+    - max_bytes: quando o diretório passa do limite, apaga os menos usados (LRU pelo mtime)
+    Pode ser compartilhado entre threads e entre execuções.
+    """
+
+    def __init__(self, directory, ttl_seconds, max_bytes):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = sum(size for _, _, size in self._scan())
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json.z")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            self._count("misses")
+            return None
+
+        if time.time() - payload["created_at"] > self.ttl_seconds:
+            self._remove(path)
+            self._count("misses")
+            return None
+
+        # Marca como usado agora (o mtime é a "idade" do LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return payload["value"]
+
+    def set(self, key, value):
+        path = self._path(key)
+        data = zlib.compress(json.dumps({"created_at": time.time(), "value": value}, ensure_ascii=False).encode("utf-8"))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escrita atômica: outro processo nunca lê um arquivo pela metade
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - old_size
+            self.stats["writes"] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def purge(self, predicate):
+        """Apaga todos os itens cujo valor satisfaz predicate(valor). Retorna quantos foram apagados."""
+        removed = 0
+        for path, _, _ in list(self._scan()):
+            try:
+                with open(path, "rb") as f:
+                    value = json.loads(zlib.decompress(f.read()))["value"]
+            except (OSError, ValueError, KeyError, zlib.error):
+                continue
+            if predicate(value):
+                self._remove(path)
+                removed += 1
+        return removed
+
+    def _evict(self):
+        """Apaga os arquivos menos usados até ficar em 90% do limite (chamado com o lock)."""
+        target = self.max_bytes * 0.9
+        files = sorted(self._scan(), key=lambda item: item[1])
+        self._total_bytes = sum(size for _, _, size in files)
+
+        for path, _, size in files:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def _scan(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".json.z"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def _remove(self, path):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
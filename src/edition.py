@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import SessionLocal
+from src.models import DeliveryOutbox
+from src.checkpoints import CheckpointStore
+from src.scraper import NewsScraper
+from src.dedup import collapse_near_duplicates
+from src.ai_curator import NewsCurator
+from src.epub_generator import EpubGenerator
+from src.delivery import DeliveryWorker, enqueue_delivery
+from src.metrics import metrics
+
+
+class UserEdition:
+    """
+    O jornal de UM usuário em UMA edição, separado em etapas:
+    coleta -> curadoria -> download -> resumos -> briefing -> EPUB -> fila de entrega (-> PDF de backup).
+    Cada etapa é salva como checkpoint (uma nova execução no mesmo dia continua de onde parou).
+    build() roda tudo em sequência (o main.py com threads); o pipeline assíncrono (src/pipeline.py)
+    chama as etapas separadamente, cada uma no seu estágio.
+    Cada etapa devolve False quando o jornal termina ali (o motivo fica em self.status).
+    """
+
+    def __init__(self, user, shared):
+        self.user = user
+        self.edition_date = shared['edition_date']
+        # Sessão própria: a edição pode passar por várias threads, mas uma etapa por vez
+        self.db = SessionLocal()
+        self.checkpoints = CheckpointStore(self.db, user.id, self.edition_date)
+        self.status = None
+        self.started = time.monotonic()
+
+        self.scraper = NewsScraper(
+            self.db,
+            feed_cache=shared['feed_cache'],
+            history_index=shared['history_index'],
+            article_cache=shared['article_cache']
+        )
+        self.curator = NewsCurator(summary_cache=shared['summary_cache'], shared_requests=shared['shared_requests'])
+        # PDF de backup fora do caminho da entrega (None: PDF desligado na execução)
+        self.pdf_backups = shared.get('pdf_backups')
+
+        self.candidates = None
+        self.selected = None
+        # Artigos baixados esperando o resumo (no pipeline assíncrono, entre um estágio e outro)
+        self.downloaded = None
+        self.articles = None
+        self.briefing = None
+        self.files = None
+        self.outbox_id = None
+
+    def finish(self, status):
+        self.status = status
+        return False
+
+    @property
+    def result(self):
+        """Status final e última etapa concluída, para o relatório."""
+        return {"status": self.status, "stage": self.checkpoints.last_stage}
+
+    def release(self):
+        """Devolve a conexão ao pool entre uma etapa e outra (a sessão continua utilizável)."""
+        self.db.close()
+
+    def close(self):
+        self.db.close()
+
+    # --- Sequencial ---
+
+    def build(self):
+        if (self.collect() and self.select()
+                and self.summarize(None if self.articles_ready else self.download_all())
+                and self.write_briefing() and self.render() and self.enqueue()):
+            self.check_delivery()
+        return self.result
+
+    # --- Etapas ---
+
+    def collect(self):
+        print(f"\n==========================================")
+        print(f"👤 Processando jornal para: {self.user.name} ({self.user.email})")
+        print(f"==========================================")
+
+        def collect():
+            found = self.scraper.get_candidates(self.user, limit_per_source=4)
+            # Junta a mesma história vinda de fontes diferentes (local, antes de gastar com a IA)
+            with metrics.timer("dedup"):
+                return collapse_near_duplicates(found)
+
+        self.candidates = self.checkpoints.run("candidates", collect)
+        if not self.candidates:
+            print("💤 Nenhuma notícia nova encontrada para este usuário hoje.")
+            return self.finish("sem novidades")
+        return True
+
+    def select(self):
+        self.selected = self.checkpoints.run(
+            "selection", lambda: self.curator.filter_candidates(self.candidates, self.user, limit=2)
+        )
+        # A lista completa de candidatos não é mais necessária (não fica ocupando memória na fila)
+        self.candidates = None
+        if not self.selected:
+            print("🧹 A IA filtrou todas as notícias (nada relevante).")
+            return self.finish("nada relevante")
+        return True
+
+    @property
+    def articles_ready(self):
+        """Os artigos (baixados e resumidos) já estão no checkpoint: não precisa baixar de novo."""
+        return self.checkpoints.get("articles") is not None
+
+    def download(self, item):
+        """Baixa UM artigo selecionado. Retorna o artigo com o conteúdo, ou None se falhou."""
+        content_data = self.scraper.download_article_content(item['url'])
+        return {**item, **content_data} if content_data else None
+
+    def download_all(self):
+        print(f"📚 Baixando e resumindo {len(self.selected)} artigos...")
+        return [article for article in map(self.download, self.selected) if article]
+
+    def summarize(self, downloaded):
+        """Resume os artigos baixados ('downloaded' é ignorado se a etapa já está no checkpoint)."""
+        def summarize():
+            # Gera os resumos com IA (em lote: vários artigos por chamada)
+            summaries = self.curator.summarize_articles(downloaded)
+            if any(summary is None for summary in summaries):
+                # Sem checkpoint: a próxima tentativa pede de novo ao Gemini só o que faltou
+                # (os resumos que deram certo já estão no cache)
+                return None
+            for full_article, summary in zip(downloaded, summaries):
+                full_article['ai_summary'] = summary
+                # O texto completo já foi usado no resumo: não precisa ir para o checkpoint
+                full_article.pop('content', None)
+            return downloaded
+
+        self.articles = self.checkpoints.run("articles", summarize)
+        if self.articles is None:
+            print("❌ A IA não conseguiu resumir todos os artigos: o jornal fica para uma nova tentativa.")
+            return self.finish("erro nos resumos")
+        if not self.articles:
+            print("❌ Falha ao processar conteúdos.")
+            return self.finish("falha no conteúdo")
+        return True
+
+    def write_briefing(self):
+        self.briefing = self.checkpoints.run(
+            "briefing", lambda: self.curator.generate_briefing([art['ai_summary'] for art in self.articles])
+        )
+        if self.briefing is None:
+            print("❌ A IA não conseguiu escrever o briefing: o jornal fica para uma nova tentativa.")
+            return self.finish("erro no briefing")
+        return True
+
+    def render(self):
+        # O id evita que dois usuários com o mesmo primeiro nome sobrescrevam o arquivo um do outro
+        base_filename = f"Jornal_{self.user.name.split()[0]}_{self.user.id}_{self.edition_date}"
+
+        def render():
+            # Gera a versão EPUB (Para envio); o PDF de backup fica para depois do envio
+            epub_path = EpubGenerator().create_epub(
+                self.briefing,
+                self.articles,
+                output_filename=f"{base_filename}.epub",
+                edition_date=self.edition_date
+            )
+            if not epub_path:
+                return None
+            return {"epub_path": epub_path}
+
+        self.files = self.checkpoints.run("render", render)
+        if self.files and not os.path.exists(self.files['epub_path']):
+            # O checkpoint diz que o EPUB existe, mas o arquivo sumiu: gera de novo
+            self.checkpoints.discard("render")
+            self.files = self.checkpoints.run("render", render)
+
+        if not self.files:
+            return self.finish("falha no EPUB")
+
+        # PDF só para quem pediu (User.output_formats) e que ainda não existe (ex: de uma execução anterior)
+        pdf_filename = f"{base_filename}.pdf"
+        if (self.pdf_backups is not None and self.user.wants_pdf
+                and not os.path.exists(os.path.join("data", "output", "pdfs", pdf_filename))):
+            self.pdf_backups.defer(self.user.id, self.briefing, self.articles, pdf_filename)
+        return True
+
+    def enqueue(self):
+        # O envio (e o histórico, só depois do envio) fica com o DeliveryWorker, com novas tentativas.
+        # Com o checkpoint, repetir a execução não coloca o mesmo jornal duas vezes na fila.
+        def enqueue():
+            item = enqueue_delivery(self.db, self.user.id, self.files['epub_path'], self.user.kindle_email, self.articles)
+            print(f"📮 EPUB na fila de entrega para: {self.user.kindle_email}")
+            return {"outbox_id": item.id}
+
+        self.outbox_id = self.checkpoints.run("enqueue", enqueue)['outbox_id']
+        self.status = "na fila"
+        return True
+
+    def check_delivery(self):
+        """
+        Se o jornal já foi entregue (ex: numa execução anterior de hoje), o status é 'enviado'.
+        Se a entrega tinha desistido ('failed'), rodar a edição de novo devolve o item para a fila.
+        """
+        outbox_item = self.db.get(DeliveryOutbox, self.outbox_id)
+        if outbox_item is not None and outbox_item.status == "sent":
+            self.status = "enviado"
+        elif outbox_item is not None and outbox_item.status == "failed":
+            DeliveryWorker.requeue_failed(self.db, DeliveryOutbox.id == outbox_item.id)
+            print(f"🔁 A entrega anterior tinha desistido ({outbox_item.last_error}): de volta à fila.")
+        return outbox_item
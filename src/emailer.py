@@ -1,60 +1,180 @@
 import smtplib
 import os
+import threading
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email import encoders
 from dotenv import load_dotenv
 
+from src.metrics import metrics
+
 load_dotenv()
 
+
+class SMTPConnectError(Exception):
+    """Não deu para abrir (ou autenticar) a conexão SMTP: servidor recusou, fora do ar, DNS, login."""
+
+
 class EmailSender:
     def __init__(self):
         self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", 587))
         self.sender_email = os.getenv("SENDER_EMAIL")
         self.password = os.getenv("EMAIL_PASSWORD")
-        
+        self.timeout = float(os.getenv("SMTP_TIMEOUT", 60))
+        # STARTTLS é obrigatório no Gmail; desligue só para relays locais (ex: servidor SMTP de teste)
+        self.use_starttls = os.getenv("SMTP_STARTTLS", "1") != "0"
+
         # O kindle_email padrão do .env fica como fallback
         self.default_kindle_email = os.getenv("KINDLE_EMAIL")
 
+        # Conexão SMTP reaproveitada entre envios (um login por N mensagens, não um por e-mail).
+        # Depois de N mensagens a conexão é renovada, para não esbarrar nos limites do Gmail.
+        self.max_messages_per_connection = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", 50))
+        self._server = None
+        self._sent_on_connection = 0
+        # A mesma instância pode ser usada por vários workers: um envio por vez na conexão
+        self._lock = threading.Lock()
+
+    @metrics.timed("send")
     def send_pdf(self, pdf_path, target_email=None):
         """
-        Envia o PDF. Se target_email for informado, usa ele. 
+        Envia o PDF. Se target_email for informado, usa ele.
         Senão, usa o padrão do .env.
         """
         recipient = target_email or self.default_kindle_email
-        
+
         if not recipient:
             print("❌ Erro: Nenhum e-mail de destino informado.")
             return False
 
         print(f"📧 Enviando de {self.sender_email} para {recipient}...")
 
+        try:
+            message = self._build_message(pdf_path, recipient)
+            self._send(recipient, message)
+            print("📩 E-mail enviado com sucesso!")
+            return True
+        except Exception as e:
+            metrics.error("send")
+            print(f"❌ Falha no envio do e-mail: {e}")
+            return False
+
+    def send_many(self, deliveries):
+        """
+        Envia vários arquivos pela mesma conexão (usado pelo DeliveryWorker, um lote por thread).
+        'deliveries' é uma lista de (caminho_do_arquivo, email_destino).
+        Retorna uma lista com o resultado de cada destinatário: {recipient, path, sent, error}.
+        Se o servidor SMTP não aceitar a conexão, o resto do lote nem é tentado (mesmo erro para todos).
+        """
+        results = []
+        connect_error = None
+        for path, recipient in deliveries:
+            recipient = recipient or self.default_kindle_email
+            if connect_error is not None:
+                results.append({"recipient": recipient, "path": path, "sent": False, "error": connect_error})
+                continue
+            try:
+                with metrics.timer("send"):
+                    self._send(recipient, self._build_message(path, recipient))
+                results.append({"recipient": recipient, "path": path, "sent": True, "error": None})
+            except SMTPConnectError as e:
+                connect_error = str(e)
+                print(f"❌ {connect_error}")
+                results.append({"recipient": recipient, "path": path, "sent": False, "error": connect_error})
+            except Exception as e:
+                results.append({"recipient": recipient, "path": path, "sent": False, "error": str(e)})
+
+        sent = sum(1 for r in results if r["sent"])
+        print(f"📩 {sent}/{len(results)} e-mails enviados.")
+        return results
+
+    def close(self):
+        with self._lock:
+            self._drop_connection()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _build_message(self, file_path, recipient):
         msg = MIMEMultipart()
         msg['From'] = self.sender_email
         msg['To'] = recipient
-        msg['Subject'] = "" 
+        msg['Subject'] = ""
 
         msg.attach(MIMEText("", 'plain'))
 
+        with open(file_path, "rb") as attachment:
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(attachment.read())
+
+        encoders.encode_base64(part)
+        filename = os.path.basename(file_path)
+        part.add_header("Content-Disposition", f"attachment; filename= {filename}")
+        msg.attach(part)
+        return msg.as_string()
+
+    def _send(self, recipient, message):
+        with self._lock:
+            # Se uma conexão REAPROVEITADA caiu no meio (timeout do servidor, rede), reconecta e tenta uma vez mais.
+            # Falha ao conectar (servidor recusou, fora do ar) não é conexão perdida: sobe como SMTPConnectError.
+            for attempt in range(2):
+                server, reused = self._get_connection()
+                try:
+                    server.sendmail(self.sender_email, recipient, message)
+                    self._sent_on_connection += 1
+                    metrics.inc("emails_sent")
+                    metrics.inc("email_bytes", len(message))
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+                    self._drop_connection()
+                    if attempt == 1 or not reused:
+                        raise
+                    print(f"🔌 Conexão SMTP perdida ({e}). Reconectando...")
+                except smtplib.SMTPResponseException as e:
+                    # 421: o servidor está fechando a conexão (ex: limite de mensagens)
+                    self._drop_connection()
+                    if e.smtp_code != 421 or attempt == 1:
+                        raise
+
+    def _get_connection(self):
+        """
+        Chamado com o lock. Abre (ou renova) a conexão autenticada.
+        Retorna (conexão, reaproveitada): reaproveitada=False quando acabou de ser aberta.
+        """
+        if self._server is not None and self._sent_on_connection >= self.max_messages_per_connection:
+            self._drop_connection()
+
+        if self._server is not None:
+            return self._server, True
+
+        try:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        except (OSError, smtplib.SMTPException) as e:
+            raise SMTPConnectError(f"Não foi possível conectar ao SMTP {self.smtp_server}:{self.smtp_port}: {e}") from e
         try:
-            with open(pdf_path, "rb") as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-            
-            encoders.encode_base64(part)
-            filename = os.path.basename(pdf_path)
-            part.add_header("Content-Disposition", f"attachment; filename= {filename}")
-            msg.attach(part)
-
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
+            if self.use_starttls:
+                server.starttls()
             server.login(self.sender_email, self.password)
-            server.sendmail(self.sender_email, recipient, msg.as_string())
-            server.quit()
-            print("📩 E-mail enviado com sucesso!")
-            return True
-        except Exception as e:
-            print(f"❌ Falha no envio do e-mail: {e}")
-            return False
\ No newline at end of file
+        except (OSError, smtplib.SMTPException) as e:
+            server.close()
+            raise SMTPConnectError(f"Não foi possível autenticar no SMTP {self.smtp_server}: {e}") from e
+        self._server = server
+        self._sent_on_connection = 0
+        metrics.inc("smtp_connections")
+        return self._server, False
+
+    def _drop_connection(self):
+        """Chamado com o lock."""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+        self._sent_on_connection = 0
@@ -1,9 +1,38 @@
+import hashlib
+import io
 import os
+import re
+import shutil
+import threading
+import time
 import uuid
+import zipfile
+from functools import lru_cache
 from ebooklib import epub
 from datetime import datetime
 
+from src.metrics import metrics
+
+# Data fixa nas entradas do ZIP: o mesmo conteúdo gera os mesmos bytes
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Namespace dos identificadores (uuid5) das edições
+EDITION_NAMESPACE = uuid.UUID("6f1d3c0e-8a57-4f5e-9d1b-3c2a7b9e4d10")
+
+# Pasta com um EPUB por edição única (os arquivos dos destinatários são hard links para eles)
+STORE_DIR = os.path.join("data", "output", "epubs", ".store")
+# Um build por edição idêntica ao mesmo tempo: locks fixos, escolhidos pelo hash (não cresce com as edições)
+_build_locks = [threading.Lock() for _ in range(64)]
+
+
 class EpubGenerator:
+    """
+    Gera o EPUB de uma edição de forma determinística: o identificador e os bytes vêm do conteúdo
+    (briefing, artigos e data), nunca de uuid4 ou do relógio. O arquivo é montado uma vez por edição
+    única em data/output/epubs/.store/<hash>.epub e cada destinatário recebe um hard link para ele
+    (ou uma cópia, se o sistema de arquivos não suportar links).
+    Os capítulos renderizados ficam num cache em memória pelo hash do resumo.
+    """
+
     def __init__(self):
         self.css_style = '''
             body { font-family: "Bookerly", "Charis SIL", serif; margin: 5%; }
@@ -17,11 +46,68 @@ class EpubGenerator:
             img { max-width: 100%; height: auto; display: block; margin: 1em auto; }
         '''
 
-    def create_epub(self, briefing_text, articles_list, output_filename="daily_briefing.epub"):
-        # 1. Configuração Básica do Livro
+    @metrics.timed("epub")
+    def create_epub(self, briefing_text, articles_list, output_filename="daily_briefing.epub", edition_date=None):
+        # A data da edição (e não o relógio) entra no título e no 'modified': o mesmo dia gera os mesmos bytes
+        if edition_date:
+            edition_day = datetime.strptime(edition_date, "%Y-%m-%d")
+        else:
+            edition_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        images = self._load_images(articles_list)
+        edition_hash = self._edition_hash(briefing_text, articles_list, images, edition_day)
+
+        output_path = os.path.join("data", "output", "epubs", output_filename)
+        store_path = os.path.join(STORE_DIR, f"{edition_hash}.epub")
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+
+        with _build_lock(edition_hash):
+            if os.path.exists(store_path):
+                metrics.inc("epub_reused")
+                print(f"♻️ EPUB idêntico já gerado: reaproveitando {edition_hash[:12]}.")
+            else:
+                data = self._build(briefing_text, articles_list, images, edition_day, edition_hash)
+                tmp_path = f"{store_path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, store_path)
+                metrics.inc("epub_bytes", len(data))
+
+        _link_or_copy(store_path, output_path)
+        print(f"📘 EPUB gerado com sucesso em: {output_path}")
+        return output_path
+
+    @staticmethod
+    def _load_images(articles_list):
+        """Bytes da imagem de cada artigo que tem uma (posição do artigo -> bytes)."""
+        images = {}
+        for idx, art in enumerate(articles_list):
+            if art.get('local_image_path') and os.path.exists(art['local_image_path']):
+                try:
+                    with open(art['local_image_path'], 'rb') as f:
+                        images[idx] = f.read()
+                except Exception as e:
+                    print(f"Erro ao anexar imagem EPUB: {e}")
+        return images
+
+    @staticmethod
+    def _edition_hash(briefing_text, articles_list, images, edition_day):
+        """Hash de tudo que vai para dentro do EPUB: mesma edição = mesmo hash."""
+        digest = hashlib.sha256()
+        for part in [edition_day.strftime("%Y-%m-%d"), briefing_text]:
+            digest.update(part.encode("utf-8") + b"\0")
+        for idx, art in enumerate(articles_list):
+            for field in ('title', 'source', 'url', 'ai_summary'):
+                digest.update(str(art.get(field, '')).encode("utf-8") + b"\0")
+            digest.update(hashlib.sha256(images.get(idx, b"")).digest())
+        return digest.hexdigest()
+
+    def _build(self, briefing_text, articles_list, images, edition_day, edition_hash):
+        """Monta o EPUB em memória e devolve os bytes."""
+        # 1. Configuração Básica do Livro (identificador derivado do conteúdo)
         book = epub.EpubBook()
-        book.set_identifier(str(uuid.uuid4()))
-        book.set_title(f"Jornal Karteiro - {datetime.now().strftime('%d/%m/%Y')}")
+        book.set_identifier(f"urn:uuid:{uuid.uuid5(EDITION_NAMESPACE, edition_hash)}")
+        book.set_title(f"Jornal Karteiro - {edition_day.strftime('%d/%m/%Y')}")
         book.set_language('pt-br')
         book.add_author('Github: diegusxavier')
 
@@ -35,7 +121,7 @@ class EpubGenerator:
         # Nota: Para um HTML mais robusto, poderíamos usar a lib 'markdown', mas faremos substituições simples aqui
         briefing_html = f"<h1>Briefing do Dia</h1>"
         briefing_html += self._markdown_to_html(briefing_text)
-        
+
         c_briefing = epub.EpubHtml(title='Briefing Executivo', file_name='briefing.xhtml', lang='pt-br')
         c_briefing.content = briefing_html
         c_briefing.add_item(nav_css)
@@ -46,48 +132,26 @@ class EpubGenerator:
         for idx, art in enumerate(articles_list):
             # Cria nome de arquivo único
             file_name = f'article_{idx}.xhtml'
-            
+
             # Título e Metadados
             title = art.get('title', 'Sem Título')
             source = art.get('source', 'Fonte Desconhecida')
             url = art.get('url', '#')
-            
+
             # Processamento de Imagem
             img_tag = ""
-            if art.get('local_image_path') and os.path.exists(art['local_image_path']):
-                try:
-                    # Adiciona a imagem ao pacote EPUB
-                    img_filename = f"img_{idx}.jpg"
-                    with open(art['local_image_path'], 'rb') as f:
-                        img_content = f.read()
-                    
-                    epub_img = epub.EpubItem(uid=f"img_{idx}", file_name=f"images/{img_filename}", media_type="image/jpeg", content=img_content)
-                    book.add_item(epub_img)
-                    img_tag = f'<img src="images/{img_filename}" alt="Imagem da Notícia" />'
-                except Exception as e:
-                    print(f"Erro ao anexar imagem EPUB: {e}")
-
-            # Conteúdo (Resumo da IA)
-            content_body = self._markdown_to_html(art.get('ai_summary', ''))
-
-            # Monta o HTML do capítulo
-            html_content = f"""
-                <h1>{title}</h1>
-                <p class="meta">Fonte: {source}</p>
-                {img_tag}
-                <div class="content">
-                    {content_body}
-                </div>
-                <hr class="divider"/>
-                <p style="text-align: center;">
-                    <a href="{url}">🔗 Ler notícia original completa</a>
-                </p>
-            """
+            if idx in images:
+                # Adiciona a imagem ao pacote EPUB
+                img_filename = f"img_{idx}.jpg"
+                epub_img = epub.EpubItem(uid=f"img_{idx}", file_name=f"images/{img_filename}", media_type="image/jpeg", content=images[idx])
+                book.add_item(epub_img)
+                img_tag = f'<img src="images/{img_filename}" alt="Imagem da Notícia" />'
 
+            # HTML do capítulo: o mesmo artigo com o mesmo resumo sai do cache (entre usuários)
             chapter = epub.EpubHtml(title=title, file_name=file_name, lang='pt-br')
-            chapter.content = html_content
+            chapter.content = _render_chapter(title, source, url, art.get('ai_summary', ''), img_tag)
             chapter.add_item(nav_css)
-            
+
             book.add_item(chapter)
             chapters.append(chapter)
 
@@ -98,31 +162,107 @@ class EpubGenerator:
         )
 
         book.spine = ['nav'] + chapters
-        
+
         # Cria atalhos de navegação
         book.add_item(epub.EpubNcx())
         book.add_item(epub.EpubNav())
 
-        # 5. Salva o Arquivo
-        output_path = os.path.join("data", "output", "epubs", output_filename)
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        epub.write_epub(output_path, book, {})
-        print(f"📘 EPUB gerado com sucesso em: {output_path}")
-        return output_path
+        # 5. Gera o arquivo (sem data/hora do relógio em lugar nenhum)
+        buffer = io.BytesIO()
+        epub.write_epub(buffer, book, {"mtime": edition_day})
+        return _normalize_zip(buffer.getvalue())
 
     def _markdown_to_html(self, text):
         """Conversor simples de MD para HTML para manter dependências leves"""
-        html = text.replace('\n', '<br/>')
-        # Negrito
-        import re
-        html = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', html)
-        # Itálico
-        html = re.sub(r'\*(.*?)\*', r'<em>\1</em>', html)
-        # Headers (simples)
-        html = re.sub(r'### (.*?)<br/>', r'<h3>\1</h3>', html)
-        html = re.sub(r'## (.*?)<br/>', r'<h2>\1</h2>', html)
-        # Bullets (simples - transforma linha com * ou - em item solto, idealmente seria <ul>)
-        html = re.sub(r'<br/>(\*|-) (.*?)', r'<br/>• \2', html)
-        
-        return html
\ No newline at end of file
+        return _markdown_to_html(text)
+
+
+@lru_cache(maxsize=1024)
+def _markdown_to_html(text):
+    """Conversor simples de MD para HTML (em cache: o mesmo resumo vai para vários usuários)"""
+    html = text.replace('\n', '<br/>')
+    # Negrito
+    html = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', html)
+    # Itálico
+    html = re.sub(r'\*(.*?)\*', r'<em>\1</em>', html)
+    # Headers (simples)
+    html = re.sub(r'### (.*?)<br/>', r'<h3>\1</h3>', html)
+    html = re.sub(r'## (.*?)<br/>', r'<h2>\1</h2>', html)
+    # Bullets (simples - transforma linha com * ou - em item solto, idealmente seria <ul>)
+    html = re.sub(r'<br/>(\*|-) (.*?)', r'<br/>• \2', html)
+
+    return html
+
+
+@lru_cache(maxsize=1024)
+def _render_chapter(title, source, url, summary, img_tag):
+    """HTML de um capítulo de artigo (article_N.xhtml), em cache pelo conteúdo do artigo e do resumo."""
+    # Conteúdo (Resumo da IA)
+    content_body = _markdown_to_html(summary)
+
+    # Monta o HTML do capítulo
+    return f"""
+                <h1>{title}</h1>
+                <p class="meta">Fonte: {source}</p>
+                {img_tag}
+                <div class="content">
+                    {content_body}
+                </div>
+                <hr class="divider"/>
+                <p style="text-align: center;">
+                    <a href="{url}">🔗 Ler notícia original completa</a>
+                </p>
+            """
+
+
+def _build_lock(edition_hash):
+    return _build_locks[int(edition_hash[:8], 16) % len(_build_locks)]
+
+
+def prune_store(days_to_keep):
+    """
+    Apaga de STORE_DIR os EPUBs de edições com mais de 'days_to_keep' dias. Os arquivos já entregues
+    continuam nos hard links de cada destinatário. Retorna quantos foram apagados.
+    """
+    if not os.path.isdir(STORE_DIR):
+        return 0
+    cutoff = time.time() - days_to_keep * 86400
+    removed = 0
+    for name in os.listdir(STORE_DIR):
+        if not name.endswith(".epub"):
+            continue
+        path = os.path.join(STORE_DIR, name)
+        # Com o lock da edição: não apaga um arquivo que outro worker está prestes a linkar
+        with _build_lock(name[:-len(".epub")]):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def _normalize_zip(data):
+    """Regrava o ZIP com a data fixa em todas as entradas (mesma ordem e compressão; mimetype sem compressão)."""
+    source = zipfile.ZipFile(io.BytesIO(data))
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as target:
+        for entry in source.infolist():
+            info = zipfile.ZipInfo(entry.filename, date_time=ZIP_DATE_TIME)
+            info.compress_type = entry.compress_type
+            info.external_attr = 0o644 << 16
+            target.writestr(info, source.read(entry.filename))
+    return output.getvalue()
+
+
+def _link_or_copy(store_path, output_path):
+    """Cada destinatário ganha um hard link para o arquivo da edição (cópia se o link não for possível)."""
+    tmp_path = f"{output_path}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(store_path, tmp_path)
+    except OSError:
+        shutil.copyfile(store_path, tmp_path)
+    os.replace(tmp_path, output_path)
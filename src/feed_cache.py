@@ -0,0 +1,227 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feedparser
+
+from src.feed_fetcher import FeedFetcher
+from src.models import FeedState
+
+
+def normalize_feed_url(url):
+    """
+    Normaliza a URL do feed para servir de chave do cache.
+    Ex: 'HTTPS://TechCrunch.com:443/feed/#x' e 'https://techcrunch.com/feed/' viram a mesma chave.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    netloc = parts.netloc.lower()
+
+    # Remove portas padrão (não mudam o destino)
+    if scheme == "http" and netloc.endswith(":80"):
+        netloc = netloc[:-3]
+    elif scheme == "https" and netloc.endswith(":443"):
+        netloc = netloc[:-4]
+
+    # O fragmento (#...) nunca chega ao servidor, então é descartado
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+class FeedCache:
+    """
+    Cache de feeds RSS com escopo de UMA execução.
+    Vários usuários assinam as mesmas fontes: cada feed é baixado e parseado
+    uma única vez, e todos os usuários filtram a mesma lista de entradas.
+    """
+
+    def __init__(self, fetcher: FeedFetcher = None, session_factory=None):
+        """
+        Com 'session_factory' (ex: SessionLocal), o cache envia GET condicional (ETag / Last-Modified)
+        e guarda o estado de cada feed na tabela feed_states, numa sessão própria a cada download
+        (nunca a sessão de quem pediu: vários workers usam o cache ao mesmo tempo);
+        sem 'session_factory', sempre baixa o feed completo.
+        """
+        # url normalizada -> lista de entradas (dicts) ou a exceção da primeira tentativa
+        self._feeds = {}
+        # url normalizada -> Event dos feeds sendo baixados agora (single-flight)
+        self._loading = {}
+        self.fetcher = fetcher or FeedFetcher()
+        self.session_factory = session_factory
+        # Protege só os dicionários e as estatísticas: o download acontece fora do lock,
+        # então uma leitura em cache nunca espera o download de outro feed
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "fetches": 0, "errors": 0, "not_modified": 0, "full_fetches": 0}
+
+    def prefetch(self, urls):
+        """
+        Baixa em paralelo todos os feeds ainda não carregados nesta execução.
+        Retorna {url: entradas ou exceção}, o mesmo resultado que get_entries() daria para cada fonte.
+        """
+        keys = {url: normalize_feed_url(url) for url in urls}
+        self._ensure(list(dict.fromkeys(keys.values())), announce=True)
+        with self._lock:
+            return {url: self._feeds[key] for url, key in keys.items()}
+
+    def get_entries(self, url):
+        """
+        Retorna as entradas do feed como dicts simples (link, title, published, guid, summary).
+        Se o download falhou antes nesta execução, relança o mesmo erro sem tentar de novo.
+        """
+        key = normalize_feed_url(url)
+        self._count("requests")
+        self._ensure([key])
+        with self._lock:
+            cached = self._feeds[key]
+
+        if isinstance(cached, Exception):
+            raise cached
+        return cached
+
+    def _ensure(self, keys, announce=False):
+        """
+        Garante que 'keys' estão no cache. Cada feed é baixado por um só worker:
+        quem pede um feed que outro worker já está baixando só espera aquele download.
+        """
+        with self._lock:
+            missing = [key for key in keys if key not in self._feeds and key not in self._loading]
+            for key in missing:
+                self._loading[key] = threading.Event()
+            waiting = [self._loading[key] for key in keys if key in self._loading and key not in missing]
+
+        if missing:
+            if announce:
+                print(f"📡 Baixando {len(missing)} feeds em paralelo...")
+            results = {}
+            try:
+                results = self._load(missing)
+            except Exception as e:
+                results = {key: e for key in missing}
+            finally:
+                with self._lock:
+                    for key in missing:
+                        result = results.get(key)
+                        self._feeds[key] = result if result is not None else RuntimeError("feed não carregado")
+                        self._loading.pop(key).set()
+
+        for event in waiting:
+            event.wait()
+
+    def _load(self, keys):
+        """Baixa 'keys' (sem o lock) e devolve {url normalizada: entradas ou exceção}."""
+        db = self.session_factory() if self.session_factory is not None else None
+        try:
+            states = self._load_states(db, keys)
+
+            headers_by_url = {}
+            for key, state in states.items():
+                # Só faz sentido pedir "se mudou" quando temos as entradas da última versão guardadas
+                if not state.entries_json:
+                    continue
+                headers = {}
+                if state.etag:
+                    headers["If-None-Match"] = state.etag
+                if state.last_modified:
+                    headers["If-Modified-Since"] = state.last_modified
+                headers_by_url[key] = headers
+
+            results = {}
+            for key, result in self.fetcher.fetch_many(keys, headers_by_url).items():
+                self._count("fetches")
+                results[key] = self._store(db, key, result, states.get(key))
+
+            if db is not None:
+                try:
+                    db.commit()
+                except Exception as e:
+                    print(f"⚠️ Não foi possível salvar o estado dos feeds: {e}")
+                    db.rollback()
+            return results
+        finally:
+            if db is not None:
+                db.close()
+
+    @staticmethod
+    def _load_states(db, keys):
+        if db is None:
+            return {}
+        states = db.query(FeedState).filter(FeedState.url.in_(keys)).all()
+        return {state.url: state for state in states}
+
+    def _store(self, db, key, result, state=None):
+        if not isinstance(result, Exception):
+            try:
+                if result["status"] == 304 and state is not None:
+                    # Nada mudou: reaproveita as entradas salvas, sem parsear nada
+                    self._count("not_modified")
+                    state.last_fetched_at = datetime.now()
+                    result = json.loads(state.entries_json)
+                else:
+                    self._count("full_fetches")
+                    entries = self._parse(result["content"], result["headers"])
+                    self._save_state(db, key, result["headers"], entries, state)
+                    result = entries
+            except Exception as e:
+                result = e
+
+        if isinstance(result, Exception):
+            self._count("errors")
+        return result
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _save_state(db, key, headers, entries, state=None):
+        if db is None:
+            return
+        if state is None:
+            state = FeedState(url=key)
+            db.add(state)
+
+        state.etag = headers.get("ETag")
+        state.last_modified = headers.get("Last-Modified")
+        state.last_fetched_at = datetime.now()
+        state.last_entry_guids = json.dumps([entry["guid"] for entry in entries])
+        state.entries_json = json.dumps(entries, ensure_ascii=False)
+
+    def _parse(self, content, headers=None):
+        # Os headers vão junto: muito feed declara o charset só no Content-Type (o feedparser procura em minúsculas)
+        response_headers = {name.lower(): value for name, value in (headers or {}).items()}
+        feed = feedparser.parse(content, response_headers=response_headers)
+        return [entry for entry in map(self._entry_to_dict, feed.entries) if entry]
+
+    @staticmethod
+    def _entry_to_dict(entry):
+        """Copia só o que o pipeline usa, para a lista ser compartilhada sem efeitos colaterais."""
+        link = (entry.get('link') or '').strip()
+        title = (entry.get('title') or '').strip()
+        if not link or not title:
+            return None
+
+        return {
+            "link": link,
+            "title": title,
+            "published": entry.get('published', ''),
+            "guid": entry.get('id') or link,
+            "summary": entry.get('summary', ''),
+        }
+
+    @property
+    def saved_fetches(self):
+        return self.stats["requests"] - self.stats["fetches"]
+
+    def print_stats(self):
+        print(
+            f"📡 Feeds: {self.stats['fetches']} downloads para {self.stats['requests']} leituras "
+            f"({self.saved_fetches} downloads economizados, {self.stats['errors']} com erro)."
+        )
+        print(
+            f"   ↪️ {self.stats['not_modified']} sem mudanças (304) e "
+            f"{self.stats['full_fetches']} baixados por completo."
+        )
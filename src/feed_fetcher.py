@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import feedparser
+import requests
+
+# Tamanho máximo de cada pedaço lido do corpo do feed
+CHUNK_SIZE = 64 * 1024
+
+
+class FeedTimeoutError(Exception):
+    """O feed estourou o prazo total (conexão + fila por host + download)."""
+
+
+class FeedFetcher:
+    """
+    Baixa vários feeds em paralelo.
+    - max_workers: quantos downloads simultâneos no total
+    - per_host: quantas conexões simultâneas no mesmo site (não queremos derrubar ninguém)
+    - connect_timeout / read_timeout: timeouts de socket (segundos)
+    - deadline: tempo máximo TOTAL por feed, mesmo se o site mandar os bytes a conta-gotas
+    """
+
+    def __init__(self, max_workers=None, per_host=None, connect_timeout=None, read_timeout=None, deadline=None):
+        self.max_workers = max_workers or int(os.getenv("FEED_MAX_WORKERS", 16))
+        self.per_host = per_host or int(os.getenv("FEED_PER_HOST", 2))
+        self.connect_timeout = connect_timeout or float(os.getenv("FEED_CONNECT_TIMEOUT", 5))
+        self.read_timeout = read_timeout or float(os.getenv("FEED_READ_TIMEOUT", 15))
+        self.deadline = deadline or float(os.getenv("FEED_DEADLINE", 30))
+
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self._http = requests.Session()
+        self._http.headers["User-Agent"] = feedparser.USER_AGENT
+
+    def _slot_for(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def fetch(self, url, headers=None):
+        """
+        Baixa UM feed respeitando o limite do host e o prazo total.
+        Retorna um dict com status, content (bytes) e headers da resposta.
+        """
+        started = time.monotonic()
+        slot = self._slot_for(url)
+
+        if not slot.acquire(timeout=self.deadline):
+            raise FeedTimeoutError(f"fila do host excedeu {self.deadline:.0f}s")
+
+        try:
+            deadline_at = started + self.deadline
+            remaining = deadline_at - time.monotonic()
+            response = self._http.get(
+                url,
+                headers=headers or {},
+                timeout=(self.connect_timeout, min(self.read_timeout, max(remaining, 0.1))),
+                stream=True,
+            )
+            try:
+                response.raise_for_status()
+                # Prazo total "duro": o corpo é lido em pedaços e o prazo é conferido a cada pedaço,
+                # então um site que manda bytes a conta-gotas não segura o download além do deadline
+                chunks = []
+                for chunk in self._chunks(response):
+                    if time.monotonic() > deadline_at:
+                        raise FeedTimeoutError(f"download excedeu {self.deadline:.0f}s")
+                    chunks.append(chunk)
+                content = b"".join(chunks)
+            finally:
+                response.close()
+
+            return {
+                "status": response.status_code,
+                "content": content,
+                "headers": response.headers,
+            }
+        finally:
+            slot.release()
+
+    @staticmethod
+    def _chunks(response):
+        """
+        O corpo em pedaços assim que chegam. read1 (urllib3 2.x) devolve o que já está no socket,
+        sem esperar juntar CHUNK_SIZE bytes; cada leitura espera no máximo o read timeout.
+        """
+        read1 = getattr(response.raw, "read1", None)
+        if read1 is None:
+            yield from response.iter_content(CHUNK_SIZE)
+            return
+        while True:
+            chunk = read1(CHUNK_SIZE, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+
+    def fetch_many(self, urls, headers_by_url=None):
+        """
+        Baixa todos os feeds em paralelo. O tempo total passa a ser o do feed mais lento,
+        não a soma de todos. Retorna {url: resultado do fetch() ou a exceção}.
+        """
+        headers_by_url = headers_by_url or {}
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_urls))) as pool:
+            futures = {url: pool.submit(self.fetch, url, headers_by_url.get(url)) for url in unique_urls}
+            for url, future in futures.items():
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    results[url] = e
+        return results
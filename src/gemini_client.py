@@ -0,0 +1,176 @@
+import os
+import random
+import threading
+import time
+
+import httpx
+from google import genai
+from google.genai import types
+
+from src.metrics import metrics
+
+# Códigos HTTP que valem uma nova tentativa (quota, sobrecarga, falha temporária)
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text):
+    """Estimativa barata (~4 caracteres por token), boa o bastante para o limitador."""
+    return max(len(str(text)) // 4, 1)
+
+
+class TokenBucket:
+    """
+    Balde de tokens seguro entre threads e independente de event loop.
+    reserve() desconta na hora e devolve quanto tempo o chamador deve esperar;
+    quem espera (com time.sleep) é o chamador.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Um pedido maior que o balde inteiro esperaria para sempre: limita ao tamanho do balde
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """Quotas do Gemini: requisições por minuto (RPM) e tokens por minuto (TPM)."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm or int(os.getenv("GEMINI_RPM", 60)))
+        self.tokens = TokenBucket(tpm or int(os.getenv("GEMINI_TPM", 1_000_000)))
+
+    def reserve(self, tokens):
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_shared_limiter():
+    """Um limitador por processo: todos os NewsCurator (de todos os workers) dividem a mesma quota."""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
+
+
+class GeminiDeadlineError(Exception):
+    """A chamada ao Gemini passou do prazo configurado."""
+
+
+class GeminiClient:
+    """
+    Camada sobre o genai.Client usada pelo NewsCurator:
+    - respeita o limitador compartilhado (RPM/TPM) antes de cada chamada
+    - repete chamadas com erro temporário (429, 5xx, timeout) com backoff exponencial com jitter
+    - aplica um prazo máximo por chamada, somando todas as tentativas
+    É síncrono: o main.py (threads) e o pipeline (asyncio.to_thread) chamam generate() de uma thread.
+    """
+
+    def __init__(self, api_key=None, client=None, limiter: RateLimiter = None,
+                 max_retries=None, deadline=None, base_delay=1.0, max_delay=30.0):
+        self.deadline = deadline or float(os.getenv("GEMINI_DEADLINE", 60))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GEMINI_MAX_RETRIES", 4))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter or get_shared_limiter()
+        # Teto do timeout HTTP; cada tentativa usa só o que sobrou do prazo da chamada
+        self.client = client or genai.Client(
+            api_key=api_key,
+            http_options={"timeout": int(self.deadline * 1000)}
+        )
+        self.expected_output_tokens = int(os.getenv("GEMINI_EXPECTED_OUTPUT_TOKENS", 800))
+
+    def generate(self, model, contents, config=None):
+        """
+        O prazo (GEMINI_DEADLINE) vale para a chamada INTEIRA: espera no limitador, tentativas e backoff.
+        Cada tentativa recebe como timeout HTTP só o que sobrou do prazo.
+        """
+        estimated = estimate_tokens(contents) + self.expected_output_tokens
+        deadline_at = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            self._wait(self.limiter.reserve(estimated), deadline_at)
+            try:
+                remaining = self._remaining(deadline_at)
+                response = self.client.models.generate_content(
+                    model=model, contents=contents, config=self._with_timeout(config, remaining)
+                )
+                self._settle_usage(response, contents, estimated)
+                return response
+            except Exception as e:
+                if isinstance(e, GeminiDeadlineError) or attempt == self.max_retries or not self._is_retryable(e):
+                    metrics.inc("llm_errors")
+                    raise
+                metrics.inc("llm_retries")
+                try:
+                    self._wait(self._backoff(attempt), deadline_at)
+                except GeminiDeadlineError:
+                    metrics.inc("llm_errors")
+                    raise
+
+    def _remaining(self, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise GeminiDeadlineError(f"sem resposta em {self.deadline:.0f}s")
+        return remaining
+
+    def _wait(self, seconds, deadline_at):
+        """Dorme 'seconds', mas não deixa a espera passar do prazo da chamada."""
+        if seconds > 0:
+            if time.monotonic() + seconds >= deadline_at:
+                raise GeminiDeadlineError(f"sem resposta em {self.deadline:.0f}s (esperaria {seconds:.1f}s)")
+            time.sleep(seconds)
+
+    @staticmethod
+    def _with_timeout(config, seconds):
+        """Copia o config com o timeout HTTP desta tentativa."""
+        http_options = {"timeout": max(int(seconds * 1000), 1)}
+        if config is None:
+            return {"http_options": http_options}
+        if isinstance(config, dict):
+            return {**config, "http_options": http_options}
+        return config.model_copy(update={"http_options": types.HttpOptions(**http_options)})
+
+    def _settle_usage(self, response, contents, estimated):
+        """
+        Conta a chamada e os tokens (os reais, se a resposta trouxer; senão, a estimativa)
+        e, se a resposta gastou mais tokens que o estimado, desconta a diferença da quota.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        tokens_in = getattr(usage, "prompt_token_count", None) or estimate_tokens(contents)
+        tokens_out = getattr(usage, "candidates_token_count", None) or estimate_tokens(getattr(response, "text", "") or "")
+        metrics.inc("llm_calls")
+        metrics.inc("llm_tokens_in", tokens_in)
+        metrics.inc("llm_tokens_out", tokens_out)
+
+        total = getattr(usage, "total_token_count", None) or 0
+        if total > estimated:
+            self.limiter.tokens.reserve(total - estimated)
+
+    def _backoff(self, attempt):
+        # "Full jitter": evita que todos os workers tentem de novo no mesmo instante
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, (GeminiDeadlineError, TimeoutError, ConnectionError)):
+            return True
+        if getattr(error, "code", None) in RETRYABLE_CODES:
+            return True
+        # Erros de rede (conexão caiu, timeout de leitura) do httpx, usado pelo google-genai
+        return isinstance(error, httpx.TransportError)
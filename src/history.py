@@ -0,0 +1,173 @@
+import hashlib
+import math
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from src.models import NewsHistory
+from src.retention import PRUNE_BATCH_SIZE, prune_rows
+
+# Postgres aceita listas enormes no IN, mas consultas gigantes ficam lentas de planejar
+IN_CHUNK_SIZE = 1000
+
+
+def url_hash(url):
+    """Hash de 64 bits da URL (cabe num BIGINT com sinal): a chave do índice idx_user_url_hash."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def parse_published(value):
+    """
+    Converte a data do RSS (RFC 822, ou ISO 8601 em feeds Atom) para datetime local sem fuso,
+    como o resto das colunas DateTime. Devolve None se não der para entender.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            try:
+                parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+            except ValueError:
+                return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def find_seen_urls(db: Session, user_id, urls):
+    """
+    Retorna o conjunto de URLs (dentre 'urls') que JÁ estão no histórico do usuário.
+    Uma consulta com IN nos hashes (índice idx_user_url_hash) em vez de uma consulta por notícia;
+    a URL completa é comparada no resultado, então uma colisão de hash não esconde notícia nova.
+    """
+    by_hash = {}
+    for url in dict.fromkeys(urls):
+        by_hash.setdefault(url_hash(url), set()).add(url)
+    hashes = list(by_hash)
+    seen = set()
+
+    for start in range(0, len(hashes), IN_CHUNK_SIZE):
+        chunk = hashes[start:start + IN_CHUNK_SIZE]
+        rows = db.query(NewsHistory.url_hash, NewsHistory.url).filter(
+            NewsHistory.user_id == user_id,
+            NewsHistory.url_hash.in_(chunk)
+        ).all()
+        seen.update(url for h, url in rows if url in by_hash[h])
+
+    return seen
+
+
+def write_history(db: Session, user_id, items):
+    """
+    Grava no histórico as notícias enviadas (dicts com title, url, published) num único INSERT em lote.
+    Não faz commit: quem chama decide a transação.
+    """
+    rows = [
+        {
+            "user_id": user_id,
+            "title": item['title'],
+            "url": item['url'],
+            "url_hash": url_hash(item['url']),
+            "published_at": parse_published(item.get('published')),
+            "processed_at": datetime.now()
+        }
+        for item in items
+    ]
+    if rows:
+        db.execute(insert(NewsHistory), rows)
+    return len(rows)
+
+
+def prune_history(db: Session, days_to_keep, batch_size=PRUNE_BATCH_SIZE):
+    """
+    Apaga o histórico mais antigo que 'days_to_keep' dias, em lotes pequenos (um commit por lote),
+    usando o índice de processed_at. Mantém a tabela (e o índice de dedup) com tamanho limitado.
+    Retorna quantas linhas foram apagadas.
+    """
+    cutoff = datetime.now() - timedelta(days=days_to_keep)
+    return prune_rows(db, NewsHistory, NewsHistory.processed_at < cutoff, batch_size=batch_size)
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom simples (bytearray + double hashing).
+    'Não está' é sempre verdade; 'está' pode ser falso positivo (~error_rate).
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class HistoryIndex:
+    """
+    Índice em memória de todo o news_history, montado UMA vez por execução.
+    Para históricos muito grandes: a maioria das URLs novas é descartada pelo Bloom
+    sem ir ao banco; só os "talvez já visto" são confirmados com find_seen_urls().
+    """
+
+    def __init__(self, bloom: BloomFilter):
+        self.bloom = bloom
+        self.stats = {"checked": 0, "skipped_db": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session, error_rate=0.01):
+        total = db.query(NewsHistory).count()
+        print(f"🌸 Montando filtro de Bloom com {total} itens do histórico...")
+        bloom = BloomFilter(total, error_rate)
+
+        # Só os hashes (8 bytes) vêm do banco, não as URLs inteiras
+        rows = db.query(NewsHistory.user_id, NewsHistory.url_hash).yield_per(10000)
+        for user_id, hashed in rows:
+            bloom.add(cls._hash_key(user_id, hashed))
+        return cls(bloom)
+
+    @staticmethod
+    def _hash_key(user_id, hashed):
+        return f"{user_id}|{hashed}"
+
+    @classmethod
+    def _key(cls, user_id, url):
+        return cls._hash_key(user_id, url_hash(url))
+
+    def add(self, user_id, url):
+        with self._lock:
+            self.bloom.add(self._key(user_id, url))
+
+    def find_seen_urls(self, db: Session, user_id, urls):
+        urls = list(dict.fromkeys(urls))
+        maybe_seen = [url for url in urls if self._key(user_id, url) in self.bloom]
+
+        with self._lock:
+            self.stats["checked"] += len(urls)
+            self.stats["skipped_db"] += len(urls) - len(maybe_seen)
+
+        if not maybe_seen:
+            return set()
+        return find_seen_urls(db, user_id, maybe_seen)
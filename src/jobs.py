@@ -0,0 +1,220 @@
+import os
+import random
+import socket
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from src.database import SessionLocal
+from src.models import EditionJob, User
+
+
+def make_worker_id():
+    """Identifica o processo (container + pid) nas colunas worker_id da fila."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """
+    Fila de jobs por usuário e edição, guardada no Postgres (tabela edition_jobs).
+    - enqueue_edition: cria os jobs do dia (pode ser chamado por todos os processos, é idempotente)
+    - claim: pega o próximo job livre com FOR UPDATE SKIP LOCKED (dois workers nunca pegam o mesmo)
+    - um heartbeat em background renova o lease dos jobs em andamento deste processo
+    - job com lease vencido (processo morreu) volta a ser pego por outro worker, até max_attempts
+    - job que falhou volta para a fila com backoff exponencial (available_at), até max_attempts
+    """
+
+    def __init__(self, edition_date, worker_id=None, lease_seconds=None, heartbeat_seconds=None, max_attempts=None,
+                 retry_base_delay=None, retry_max_delay=None):
+        self.edition_date = edition_date
+        self.worker_id = worker_id or make_worker_id()
+        self.lease = timedelta(seconds=lease_seconds or float(os.getenv("JOB_LEASE_SECONDS", 300)))
+        self.heartbeat_seconds = heartbeat_seconds or float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+        self.retry_base_delay = retry_base_delay or float(os.getenv("JOB_RETRY_BASE_DELAY", 30))
+        self.retry_max_delay = retry_max_delay or float(os.getenv("JOB_RETRY_MAX_DELAY", 300))
+
+        # Jobs em andamento neste processo (renovados pelo heartbeat)
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+
+    # --- Criação dos jobs ---
+
+    def enqueue_edition(self, db):
+        """Cria um job para cada usuário ativo que ainda não tem job nesta edição. Retorna quantos criou."""
+        existing = {
+            user_id for (user_id,) in db.query(EditionJob.user_id).filter(
+                EditionJob.edition_date == self.edition_date
+            )
+        }
+        user_ids = [user_id for (user_id,) in db.query(User.id).filter(User.is_active == True)]
+
+        created = 0
+        for user_id in user_ids:
+            if user_id in existing:
+                continue
+            try:
+                # Um savepoint por job: se outro processo criou o mesmo job ao mesmo tempo, só ignora
+                with db.begin_nested():
+                    db.add(EditionJob(user_id=user_id, edition_date=self.edition_date))
+                created += 1
+            except IntegrityError:
+                pass
+        db.commit()
+        return created
+
+    # --- Claim / conclusão ---
+
+    def claim(self, db):
+        """
+        Pega o próximo job livre (pendente e fora do backoff, ou 'running' com lease vencido) e o marca
+        como deste worker. Retorna (job_id, user_id) ou None quando não há nada livre agora.
+        """
+        while True:
+            now = datetime.now()
+            job = db.query(EditionJob).filter(
+                EditionJob.edition_date == self.edition_date,
+                or_(
+                    (EditionJob.status == "pending") & or_(EditionJob.available_at.is_(None), EditionJob.available_at <= now),
+                    (EditionJob.status == "running") & (EditionJob.lease_expires_at < now)
+                )
+            ).order_by(EditionJob.id).with_for_update(skip_locked=True).first()
+
+            if job is None:
+                db.commit()
+                return None
+
+            if job.status != "running":
+                break
+            if job.attempts < self.max_attempts:
+                print(f"🪦 Lease do job {job.id} expirou (worker {job.worker_id}). Retomando.")
+                break
+
+            # O job derrubou o worker em todas as tentativas (ex: OOM, crash numa biblioteca nativa):
+            # desiste dele em vez de passá-lo de nó em nó para sempre
+            print(f"🪦 Job {job.id} derrubou o worker {job.attempts} vezes: desistindo.")
+            job.status = "failed"
+            job.last_error = f"lease expirou em {job.attempts} tentativas (worker {job.worker_id} morreu)"
+            job.lease_expires_at = None
+            job.finished_at = now
+            db.commit()
+
+        job.status = "running"
+        job.worker_id = self.worker_id
+        job.attempts += 1
+        job.heartbeat_at = now
+        job.lease_expires_at = now + self.lease
+        job_ref = (job.id, job.user_id)
+        db.commit()
+
+        with self._lock:
+            self._held.add(job_ref[0])
+        return job_ref
+
+    def complete(self, db, job_id, result):
+        self._finish(db, job_id, status="done", result=result)
+
+    def fail(self, db, job_id, error):
+        """
+        Devolve o job para a fila (ou desiste depois de max_attempts). A nova tentativa só fica
+        disponível depois do backoff: um erro passageiro (Gemini, SMTP) não queima as tentativas em segundos.
+        """
+        job = db.get(EditionJob, job_id)
+        retry = job is not None and job.attempts < self.max_attempts
+        available_at = None
+        if retry:
+            delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (job.attempts - 1)))
+            available_at = datetime.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+            print(f"🔁 Job {job_id} volta para a fila em ~{delay:.0f}s ({error}).")
+        self._finish(db, job_id, status="pending" if retry else "failed", error=error, available_at=available_at)
+        return retry
+
+    def seconds_until_next(self, db):
+        """Quanto falta para o próximo job pendente ficar disponível (0 se já está), ou None se não há pendentes."""
+        next_at = db.query(func.min(func.coalesce(EditionJob.available_at, datetime.min))).filter(
+            EditionJob.edition_date == self.edition_date,
+            EditionJob.status == "pending"
+        ).scalar()
+        db.commit()
+        if next_at is None:
+            return None
+        return max(0.0, (next_at - datetime.now()).total_seconds())
+
+    def _finish(self, db, job_id, status, result=None, error=None, available_at=None):
+        with self._lock:
+            self._held.discard(job_id)
+
+        # Só quem ainda é dono do job pode fechá-lo (se o lease venceu, outro worker já o pegou)
+        updated = db.query(EditionJob).filter(
+            EditionJob.id == job_id,
+            EditionJob.worker_id == self.worker_id,
+            EditionJob.status == "running"
+        ).update({
+            "status": status,
+            "result": result,
+            "last_error": error,
+            "lease_expires_at": None,
+            "available_at": available_at,
+            "finished_at": datetime.now() if status in ("done", "failed") else None,
+        }, synchronize_session=False)
+        db.commit()
+        if not updated:
+            print(f"⚠️ Job {job_id} não pertence mais a este worker (lease perdido): resultado descartado.")
+
+    # --- Heartbeat ---
+
+    def start_heartbeat(self):
+        self._stop.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"⚠️ Falha no heartbeat dos jobs: {e}")
+
+    def heartbeat(self):
+        """Renova o lease de todos os jobs em andamento deste processo."""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return
+
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            db.query(EditionJob).filter(
+                EditionJob.id.in_(held),
+                EditionJob.worker_id == self.worker_id,
+                EditionJob.status == "running"
+            ).update({
+                "heartbeat_at": now,
+                "lease_expires_at": now + self.lease
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    # --- Acompanhamento ---
+
+    def counts(self, db):
+        """Quantos jobs desta edição em cada status."""
+        counts = {}
+        for (status,) in db.query(EditionJob.status).filter(EditionJob.edition_date == self.edition_date):
+            counts[status] = counts.get(status, 0) + 1
+        return counts
@@ -0,0 +1,219 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Usuário sendo processado na thread/tarefa atual: os tempos medidos dentro dele são atribuídos a ele
+_current_user = contextvars.ContextVar("metrics_current_user", default=None)
+# Etapas abertas no contexto atual (uma etapa chamada dentro dela mesma não conta duas vezes)
+_active_stages = contextvars.ContextVar("metrics_active_stages", default=())
+
+
+class Metrics:
+    """
+    Métricas de UMA execução, seguras entre threads:
+    - tempo por etapa (scrape, download, curate, summarize, briefing, pdf, epub, send...) e por usuário
+    - contadores (feeds baixados, acertos de cache, chamadas e tokens do LLM, bytes enviados...)
+    - erros por etapa
+    Saída: relatório JSON da execução e arquivo texto no formato do Prometheus (textfile collector).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Modo de profiling (src/profiling.py): quando ligado, cada etapa também passa pelo profiler
+        self.profiler = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._durations = defaultdict(list)
+            self._user_stages = defaultdict(lambda: defaultdict(float))
+            self.counters = defaultdict(float)
+            self.errors = defaultdict(int)
+
+    # --- Coleta ---
+
+    @contextmanager
+    def user(self, user_id):
+        """Atribui ao usuário tudo que for medido dentro do bloco (na thread atual)."""
+        token = _current_user.set(user_id)
+        try:
+            yield
+        finally:
+            _current_user.reset(token)
+
+    @contextmanager
+    def timer(self, stage):
+        active = _active_stages.get()
+        if stage in active:
+            # Ex: summarize_articles chamando summarize_article: o tempo já está sendo medido
+            yield
+            return
+
+        token = _active_stages.set(active + (stage,))
+        started = time.perf_counter()
+        try:
+            if self.profiler is None:
+                yield
+            else:
+                with self.profiler.stage(stage):
+                    yield
+        except Exception:
+            self.error(stage)
+            raise
+        finally:
+            _active_stages.reset(token)
+            self.observe(stage, time.perf_counter() - started)
+
+    def timed(self, stage):
+        """Decorator: mede cada chamada do método/função como a etapa 'stage'."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, stage, seconds, user_id=None):
+        user_id = user_id if user_id is not None else _current_user.get()
+        with self._lock:
+            self._durations[stage].append(seconds)
+            if user_id is not None:
+                self._user_stages[user_id][stage] += seconds
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def add_stats(self, prefix, stats):
+        """Copia um dicionário de estatísticas (ex: FeedCache.stats) para os contadores."""
+        for name, value in stats.items():
+            self.inc(f"{prefix}_{name}", value)
+
+    def error(self, stage):
+        with self._lock:
+            self.errors[stage] += 1
+
+    # --- Saída ---
+
+    def stage_summary(self):
+        with self._lock:
+            durations = {stage: list(values) for stage, values in self._durations.items()}
+        summary = {}
+        for stage, values in durations.items():
+            arr = np.array(values)
+            summary[stage] = {
+                "count": len(values),
+                "total_seconds": float(arr.sum()),
+                "mean_seconds": float(arr.mean()),
+                "p50_seconds": float(np.percentile(arr, 50)),
+                "p95_seconds": float(np.percentile(arr, 95)),
+                "max_seconds": float(arr.max()),
+            }
+        return summary
+
+    def user_stages(self, user_id):
+        with self._lock:
+            return dict(self._user_stages.get(user_id, {}))
+
+    def report(self, results=None, **extra):
+        """Relatório da execução (dict pronto para JSON). 'results' são os resultados por usuário do main."""
+        finished_at = time.time()
+        users = []
+        for result in results or []:
+            users.append({**result, "stages": self.user_stages(result.get("user_id"))})
+
+        statuses = defaultdict(int)
+        for result in results or []:
+            statuses[result.get("status", "")] += 1
+
+        with self._lock:
+            counters = dict(self.counters)
+            errors = dict(self.errors)
+
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "finished_at": datetime.fromtimestamp(finished_at).isoformat(timespec="seconds"),
+            "wall_seconds": finished_at - self.started_at,
+            **extra,
+            "statuses": dict(statuses),
+            "stages": self.stage_summary(),
+            "counters": counters,
+            "errors": errors,
+            "users": users,
+        }
+
+    def write_report(self, report, directory=None):
+        """Grava o relatório em <dir>/run_<data>.json e em <dir>/latest.json. Retorna o caminho."""
+        directory = directory or os.getenv("METRICS_DIR", os.path.join("data", "output", "metrics"))
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started_at).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(directory, f"run_{stamp}.json")
+        for target in (path, os.path.join(directory, "latest.json")):
+            _atomic_write(target, json.dumps(report, ensure_ascii=False, indent=2, default=str))
+        return path
+
+    def write_prometheus(self, report, path=None):
+        """
+        Arquivo no formato texto do Prometheus (para o textfile collector do node_exporter).
+        Os valores são da última execução, por isso tudo é 'gauge'.
+        """
+        path = path or os.getenv("METRICS_PROM_FILE", os.path.join("data", "output", "metrics", "karteiro.prom"))
+        lines = []
+
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP karteiro_{name} {help_text}")
+            lines.append(f"# TYPE karteiro_{name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+                lines.append(f"karteiro_{name}{{{label_text}}} {value}" if label_text else f"karteiro_{name} {value}")
+
+        gauge("last_run_timestamp_seconds", "Fim da última execução (unix time).", [({}, time.time())])
+        gauge("last_run_duration_seconds", "Duração total da última execução.", [({}, report["wall_seconds"])])
+        gauge("last_run_users", "Usuários por status final na última execução.",
+              [({"status": status}, count) for status, count in sorted(report["statuses"].items())])
+
+        stages = sorted(report["stages"].items())
+        gauge("stage_duration_seconds_total", "Tempo somado por etapa.",
+              [({"stage": stage}, data["total_seconds"]) for stage, data in stages])
+        gauge("stage_calls", "Execuções de cada etapa.",
+              [({"stage": stage}, data["count"]) for stage, data in stages])
+        for quantile in ("p50", "p95"):
+            gauge(f"stage_duration_seconds_{quantile}", f"Duração {quantile} de cada etapa.",
+                  [({"stage": stage}, data[f"{quantile}_seconds"]) for stage, data in stages])
+        gauge("stage_duration_seconds_max", "Duração máxima de cada etapa.",
+              [({"stage": stage}, data["max_seconds"]) for stage, data in stages])
+
+        gauge("stage_errors", "Erros por etapa na última execução.",
+              [({"stage": stage}, count) for stage, count in sorted(report["errors"].items())])
+        for name, value in sorted(report["counters"].items()):
+            gauge(name, f"Contador '{name}' da última execução.", [({}, value)])
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _atomic_write(path, "\n".join(lines) + "\n")
+        return path
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _atomic_write(path, text):
+    # O Prometheus (ou quem lê o JSON) nunca vê um arquivo pela metade
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# Uma instância por processo, usada por todos os módulos
+metrics = Metrics()
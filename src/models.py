@@ -1,5 +1,5 @@
 # src/models.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from src.database import Base, engine
@@ -12,6 +12,8 @@ class User(Base):
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     kindle_email = Column(String, nullable=False)
+    # Formatos do jornal, separados por vírgula: 'epub' (só o que vai para o Kindle) ou 'epub,pdf' (+ PDF de backup)
+    output_formats = Column(String, nullable=False, default="epub,pdf", server_default="epub,pdf")
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.now)
 
@@ -33,6 +35,23 @@ class Source(Base):
 
     user = relationship("User", back_populates="sources")
 
+# Estado dos Feeds (GET condicional)
+# Uma linha por URL de feed (normalizada), compartilhada entre todos os usuários que a assinam.
+class FeedState(Base):
+    __tablename__ = "feed_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String, unique=True, index=True, nullable=False)
+
+    # Cabeçalhos devolvidos pelo servidor, reenviados como If-None-Match / If-Modified-Since
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    last_fetched_at = Column(DateTime, nullable=True)
+
+    # JSON: GUIDs da última versão baixada e as entradas já parseadas (reaproveitadas num 304)
+    last_entry_guids = Column(Text, nullable=True)
+    entries_json = Column(Text, nullable=True)
+
 # Tabela de Tópicos de Interesse
 class Interest(Base):
     __tablename__ = "interests"
@@ -52,21 +71,103 @@ class NewsHistory(Base):
     
     title = Column(String, nullable=False)
     
-    # REMOVIDO: index=True (Pois agora temos o índice composto abaixo)
+    # A URL completa fica só na tabela; o índice usa o hash de 8 bytes (largura fixa, índice pequeno)
     url = Column(String, nullable=False)
+    url_hash = Column(BigInteger, nullable=False) # ver src/history.py: url_hash()
     
-    # Mantido como String para compatibilidade com RSS variados. 
-    # Idealmente, converteríamos para DateTime no futuro.
-    published_at = Column(String, nullable=True)
+    # Data de publicação do RSS convertida para DateTime (None quando o feed traz algo ilegível)
+    published_at = Column(DateTime, nullable=True)
     
     processed_at = Column(DateTime, default=datetime.now)
 
     user = relationship("User", back_populates="history")
 
     # MELHORIA: Índice Composto
-    # Cria uma "via expressa" de busca combinando ID do Usuário + URL
+    # Cria uma "via expressa" de busca combinando ID do Usuário + hash da URL.
+    # processed_at indexado para a retenção apagar os registros antigos em lotes.
+    __table_args__ = (
+        Index('idx_user_url_hash', 'user_id', 'url_hash'),
+        Index('idx_history_processed_at', 'processed_at'),
+    )
+
+# Fila de Entregas (Outbox)
+# O EPUB gerado entra aqui e um DeliveryWorker envia depois, com novas tentativas.
+# O histórico só é gravado quando o envio dá certo (articles_json guarda o que gravar).
+class DeliveryOutbox(Base):
+    __tablename__ = "delivery_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+
+    file_path = Column(String, nullable=False)
+    recipient = Column(String, nullable=False)
+    articles_json = Column(Text, nullable=False)
+
+    # pending -> sending -> sent | failed (esgotou as tentativas)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.now)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        Index('idx_outbox_status_next', 'status', 'next_attempt_at'),
+        Index('idx_outbox_created', 'created_at'),
+    )
+
+# Checkpoints do Pipeline
+# Resultado de cada etapa (candidatos, seleção, artigos, briefing, arquivos, fila) por usuário e edição.
+# Se a execução for repetida no mesmo dia, as etapas já concluídas são reaproveitadas.
+class PipelineCheckpoint(Base):
+    __tablename__ = "pipeline_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    edition_date = Column(String, nullable=False) # 'YYYY-MM-DD'
+    stage = Column(String, nullable=False)
+    payload = Column(Text, nullable=False) # JSON
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'edition_date', 'stage', name='uq_checkpoint_user_edition_stage'),
+        Index('idx_checkpoint_edition', 'edition_date'),
+    )
+
+# Fila de Jobs (modo distribuído)
+# Um job por usuário e edição. Vários processos (em um ou mais containers) pegam jobs com
+# SELECT ... FOR UPDATE SKIP LOCKED; quem pegou renova o 'lease' com heartbeats.
+# Se o processo morrer, o lease expira e outro worker retoma o job (os checkpoints evitam refazer etapas).
+class EditionJob(Base):
+    __tablename__ = "edition_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    edition_date = Column(String, nullable=False) # 'YYYY-MM-DD'
+
+    # pending -> running -> done | failed (esgotou as tentativas)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    # Job devolvido à fila só pode ser pego de novo a partir daqui (backoff); NULL = já
+    available_at = Column(DateTime, nullable=True)
+
+    result = Column(String, nullable=True) # status do jornal ('na fila', 'sem novidades', ...)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+    user = relationship("User")
+
     __table_args__ = (
-        Index('idx_user_url', 'user_id', 'url'),
+        UniqueConstraint('user_id', 'edition_date', name='uq_job_user_edition'),
+        Index('idx_job_edition_status', 'edition_date', 'status'),
     )
 
 def init_db():
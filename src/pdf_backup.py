@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.metrics import metrics
+
+# Modos do PDF de backup: 'background' (depois do envio, num pool de processos) ou 'off' (nunca gera)
+PDF_MODES = ("background", "off")
+
+
+def _render_pdf(briefing_text, articles_list, output_filename):
+    """Roda no processo do pool: gera o PDF e devolve (caminho, segundos)."""
+    from src.pdf_generator import NewsFormatter
+
+    started = time.perf_counter()
+    pdf_path = NewsFormatter().create_pdf(briefing_text, articles_list, output_filename=output_filename)
+    return pdf_path, time.perf_counter() - started
+
+
+class PdfBackups:
+    """
+    O PDF é só um backup local (quem vai para o Kindle é o EPUB), e a diagramação do ReportLab é a etapa
+    que mais gasta CPU. Por isso ele sai do caminho da entrega:
+    - a edição registra o PDF com defer() quando o usuário quer PDF (User.output_formats)
+    - depois que o EPUB foi enviado, flush() manda os PDFs para um pool de PROCESSOS (PDF_WORKERS),
+      sem disputar o GIL com as threads que ainda estão coletando, resumindo e enviando
+    - wait() espera os PDFs no fim da execução e registra o tempo de cada um nas métricas ('pdf')
+    Com PDF_MODE=off (ou main.py --no-pdf), from_env() devolve None e nenhum PDF é gerado.
+    Com o profiling ligado (main.py --profile), os PDFs são gerados na própria thread, dentro da etapa
+    'pdf' do StageProfiler: o cProfile e o tracemalloc não enxergam os processos do pool.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or int(os.getenv("PDF_WORKERS", 2))
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pending = {}
+        self._futures = []
+        self.stats = {"generated": 0, "failed": 0}
+
+    @classmethod
+    def from_env(cls, enabled=True):
+        mode = os.getenv("PDF_MODE", "background")
+        if mode not in PDF_MODES:
+            raise ValueError(f"PDF_MODE inválido: {mode} (use {' ou '.join(PDF_MODES)})")
+        if not enabled or mode == "off":
+            return None
+        return cls()
+
+    def defer(self, user_id, briefing_text, articles_list, output_filename):
+        """Registra o PDF de um usuário; ele só é gerado no próximo flush() (depois do envio)."""
+        with self._lock:
+            self._pending[user_id] = (briefing_text, [dict(art) for art in articles_list], output_filename)
+
+    def flush(self, user_ids=None):
+        """Manda para o pool os PDFs registrados (de 'user_ids', ou todos)."""
+        with self._lock:
+            ids = list(self._pending) if user_ids is None else [i for i in user_ids if i in self._pending]
+            jobs = [(user_id, self._pending.pop(user_id)) for user_id in ids]
+            if not jobs:
+                return
+            if metrics.profiler is None:
+                self._submit(jobs)
+                return
+
+        # Fora do lock: a diagramação demora e defer() não precisa esperar por ela
+        rendered = [(user_id, args[2], self._render_profiled(args)) for user_id, args in jobs]
+        with self._lock:
+            self._futures.extend(rendered)
+
+    def _submit(self, jobs):
+        """Chamado com o lock."""
+        if self._pool is None:
+            # spawn: o processo filho não herda as threads (e os locks) da execução
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        for user_id, args in jobs:
+            self._futures.append((user_id, args[2], self._pool.submit(_render_pdf, *args)))
+
+    @staticmethod
+    def _render_profiled(args):
+        future = Future()
+        try:
+            with metrics.profiler.stage("pdf"):
+                future.set_result(_render_pdf(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def wait(self):
+        """Gera o que ainda estiver pendente e espera todos os PDFs. Retorna os caminhos gerados."""
+        self.flush()
+        paths = []
+        with self._lock:
+            futures, self._futures = self._futures, []
+        if futures and self._pool is not None:
+            print(f"📇 Esperando {len(futures)} PDFs de backup ({self.workers} processos)...")
+        for user_id, output_filename, future in futures:
+            try:
+                pdf_path, seconds = future.result()
+            except Exception as e:
+                pdf_path, seconds = None, 0
+                print(f"⚠️ Erro ao gerar o PDF {output_filename}: {e}")
+            if not pdf_path:
+                self.stats["failed"] += 1
+                metrics.error("pdf")
+                continue
+            self.stats["generated"] += 1
+            metrics.observe("pdf", seconds, user_id=user_id)
+            metrics.inc("pdf_bytes", os.path.getsize(pdf_path))
+            paths.append(pdf_path)
+        return paths
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def print_stats(self):
+        print(f"📇 PDFs de backup: {self.stats['generated']} gerados, {self.stats['failed']} com erro.")
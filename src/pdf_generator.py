@@ -8,6 +8,8 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from datetime import datetime
 
+from src.metrics import metrics
+
 class Bookmark(Flowable):
     """
     Cria um marcador na barra lateral do PDF (Outline).
@@ -116,6 +118,7 @@ class NewsFormatter:
             else: flowables.append(Paragraph(line, self.styles['BodyTextCustom']))
         return flowables
 
+    @metrics.timed("pdf")
     def create_pdf(self, briefing_text, articles_list, candidates_list=None, output_filename="daily_briefing.pdf"):
         output_path = os.path.join("data", "output", "pdfs", output_filename)
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -208,8 +211,10 @@ class NewsFormatter:
 
         try:
             doc.build(story)
+            metrics.inc("pdf_bytes", os.path.getsize(output_path))
             print(f"📇 PDF (XL + Sumário Exclusivo) gerado com sucesso em: {output_path}")
             return output_path
         except Exception as e:
+            metrics.error("pdf")
             print(f"❌ Erro ao gerar PDF: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.edition import UserEdition
+from src.delivery import DeliveryWorker
+from src.metrics import metrics
+
+# Etapas do pipeline e quantos jornais cada uma processa ao mesmo tempo (padrão)
+STAGE_CONCURRENCY = {
+    "fetch": 4,      # coleta: feeds + histórico + quase duplicados
+    "select": 4,     # curadoria (Gemini)
+    "download": 4,   # jornais baixando artigos (os downloads em si são limitados por PIPELINE_DOWNLOADS)
+    "summarize": 4,  # resumos + briefing (Gemini)
+    "render": 2,     # EPUB (o PDF de backup vai para o pool de processos depois do envio)
+    "deliver": 2,    # fila de entrega + envio SMTP
+}
+
+
+class StreamingPipeline:
+    """
+    Pipeline assíncrono (main.py --pipeline): cada etapa do jornal é um estágio com seus próprios
+    workers, ligados por filas com tamanho máximo. Enquanto um usuário baixa artigos, outro já está
+    no Gemini e um terceiro no EPUB; as etapas se sobrepõem entre usuários.
+    - concorrência por estágio: PIPELINE_<ESTÁGIO>_CONCURRENCY (ex: PIPELINE_RENDER_CONCURRENCY=2)
+    - downloads de artigos simultâneos (somando todos os jornais): PIPELINE_DOWNLOADS
+    - backpressure: fila cheia faz o estágio anterior esperar (PIPELINE_QUEUE_SIZE), então o número de
+      jornais em memória ao mesmo tempo é limitado, não importa quantos usuários existam
+    O trabalho bloqueante (banco, HTTP, Gemini, ReportLab) roda em threads (asyncio.to_thread);
+    cada jornal é um UserEdition e passa por um estágio de cada vez.
+    """
+
+    def __init__(self, shared, concurrency=None, queue_size=None, downloads=None):
+        self.shared = shared
+        self.concurrency = {
+            stage: int(os.getenv(f"PIPELINE_{stage.upper()}_CONCURRENCY", default))
+            for stage, default in STAGE_CONCURRENCY.items()
+        }
+        self.concurrency.update(concurrency or {})
+        self.queue_size = queue_size or int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
+        self.downloads = downloads or int(os.getenv("PIPELINE_DOWNLOADS", 8))
+        self.results = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def run(self, users):
+        """Processa todos os usuários e retorna os resultados (mesmo formato do run_user do main.py)."""
+        return asyncio.run(self._run(users))
+
+    async def _run(self, users):
+        # Threads para o trabalho bloqueante: uma por worker de estágio, mais os downloads
+        threads = sum(self.concurrency.values()) + self.downloads
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+        self._download_slots = asyncio.Semaphore(self.downloads)
+        self.delivery = DeliveryWorker()
+
+        stages = [
+            ("fetch", self._fetch),
+            ("select", self._select),
+            ("download", self._download),
+            ("summarize", self._summarize),
+            ("render", self._render),
+            ("deliver", self._deliver),
+        ]
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in stages]
+        print(f"🧵 Pipeline assíncrono: {len(users)} usuários, concorrência {self.concurrency}, "
+              f"filas de {self.queue_size}, {self.downloads} downloads simultâneos.")
+
+        try:
+            tasks = [asyncio.create_task(self._feed(users, queues[0], self.concurrency["fetch"]))]
+            for i, (stage, handler) in enumerate(stages):
+                if i + 1 < len(stages):
+                    outbox, next_workers = queues[i + 1], self.concurrency[stages[i + 1][0]]
+                else:
+                    outbox, next_workers = None, 0
+                tasks.append(asyncio.create_task(
+                    self._stage(stage, handler, queues[i], outbox, self.concurrency[stage], next_workers)
+                ))
+            await asyncio.gather(*tasks)
+        finally:
+            await asyncio.to_thread(self.delivery.close)
+
+        print(f"🧵 Pipeline concluído (no máximo {self.max_in_flight} jornais em andamento ao mesmo tempo).")
+        return self.results
+
+    async def _feed(self, users, queue, workers):
+        # put() espera quando a fila está cheia: os usuários entram no ritmo do pipeline
+        for user in users:
+            await queue.put(user)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def _stage(self, stage, handler, inbox, outbox, workers, next_workers):
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is None:
+                    return
+                edition = await self._handle(stage, handler, item)
+                if edition is not None:
+                    await outbox.put(edition)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        # Todos os workers deste estágio terminaram: avisa os do próximo
+        for _ in range(next_workers):
+            await outbox.put(None)
+
+    async def _handle(self, stage, handler, item):
+        """Roda uma etapa. Retorna a edição para o próximo estágio, ou None se o jornal terminou aqui."""
+        edition = item
+        try:
+            if stage == "fetch":
+                edition = await self._start(item)
+            if await handler(edition):
+                return edition
+            self._finish(edition)
+        except Exception as e:
+            user = getattr(edition, "user", item)
+            print(f"❌ Erro ao processar {user.name} (etapa {stage}): {e}")
+            if isinstance(edition, UserEdition):
+                edition.status = f"erro: {e}"
+                self._finish(edition)
+            else:
+                self.results.append({"user_id": user.id, "user": user.name, "seconds": 0, "status": f"erro: {e}", "stage": None})
+        return None
+
+    async def _start(self, user):
+        edition = await asyncio.to_thread(UserEdition, user, self.shared)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return edition
+
+    def _finish(self, edition):
+        seconds = time.monotonic() - edition.started
+        metrics.observe("user_total", seconds, user_id=edition.user.id)
+        self.results.append({"user_id": edition.user.id, "user": edition.user.name, "seconds": seconds, **edition.result})
+        edition.close()
+        self.in_flight -= 1
+
+    async def _call(self, edition, fn, *args):
+        """Roda uma etapa (bloqueante) numa thread, com as métricas atribuídas ao usuário."""
+        def call():
+            with metrics.user(edition.user.id):
+                try:
+                    return fn(*args)
+                finally:
+                    # A edição vai esperar na fila do próximo estágio: não segura uma conexão do pool
+                    edition.release()
+        return await asyncio.to_thread(call)
+
+    # --- Estágios (True: segue para o próximo) ---
+
+    async def _fetch(self, edition):
+        return await self._call(edition, edition.collect)
+
+    async def _select(self, edition):
+        return await self._call(edition, edition.select)
+
+    async def _download(self, edition):
+        if edition.articles_ready:
+            edition.downloaded = None
+            return True
+
+        async def download(item):
+            async with self._download_slots:
+                # to_thread leva o contexto junto: o tempo do download é atribuído ao usuário
+                with metrics.user(edition.user.id):
+                    return await asyncio.to_thread(edition.download, item)
+
+        print(f"📚 Baixando {len(edition.selected)} artigos para {edition.user.name}...")
+        downloaded = await asyncio.gather(*(download(item) for item in edition.selected))
+        edition.downloaded = [article for article in downloaded if article]
+        return True
+
+    async def _summarize(self, edition):
+        downloaded, edition.downloaded = edition.downloaded, None
+        return (await self._call(edition, edition.summarize, downloaded)
+                and await self._call(edition, edition.write_briefing))
+
+    async def _render(self, edition):
+        return await self._call(edition, edition.render)
+
+    async def _deliver(self, edition):
+        await self._call(edition, edition.enqueue)
+        outbox_item = await self._call(edition, edition.check_delivery)
+        if outbox_item is not None and outbox_item.status == "pending":
+            # Envia já; se falhar, fica 'na fila' e o drain do main.py tenta de novo
+            delivered = await asyncio.to_thread(self.delivery.deliver_now, [edition.outbox_id])
+            if delivered and delivered[0]['status'] == "sent":
+                edition.status = "enviado"
+            elif delivered and delivered[0]['status'] == "failed":
+                edition.status = "erro no envio"
+        if self.shared.get('pdf_backups') is not None:
+            # EPUB entregue (ou na fila para nova tentativa): agora sim o PDF de backup
+            self.shared['pdf_backups'].flush([edition.user.id])
+        return False
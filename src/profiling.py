@@ -0,0 +1,220 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+# Etapas perfiladas por padrão (os nomes são os mesmos das métricas, src/metrics.py)
+DEFAULT_STAGES = ("scrape", "curate", "download", "summarize", "briefing", "pdf", "epub", "send")
+
+
+class StageProfiler:
+    """
+    Modo de profiling sob demanda (PROFILE=1 ou main.py --profile).
+    Pendurado no metrics.timer: cada etapa medida também passa por aqui. Para cada etapa:
+    - cProfile (somado entre as chamadas): <etapa>.pstats e <etapa>.txt (top funções por tempo acumulado)
+    - tracemalloc: memory_<etapa>.txt (linhas que mais alocaram e pico de memória da etapa)
+    - amostragem das pilhas (thread em background): stacks.collapsed, pronto para o flamegraph.pl/speedscope
+    Tudo vai para um diretório por execução. Desligado, o custo é só um 'if' no metrics.timer.
+
+    cProfile e tracemalloc enxergam o processo inteiro: com vários workers, uma etapa que começa
+    enquanto outra está sendo perfilada não entra no pstats/memória (entra só nas pilhas amostradas).
+    Para números limpos, rode com --workers 1.
+    """
+
+    def __init__(self, directory=None, stages=None, sample_interval=None, memory=None, memory_frames=None):
+        base = os.getenv("PROFILE_DIR", os.path.join("data", "output", "profiles"))
+        self.directory = directory or os.path.join(base, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        stages = stages or [s.strip() for s in os.getenv("PROFILE_STAGES", "").split(",") if s.strip()]
+        self.stages = set(stages or DEFAULT_STAGES)
+        self.sample_interval = sample_interval or float(os.getenv("PROFILE_SAMPLE_MS", 5)) / 1000
+        self.memory = memory if memory is not None else os.getenv("PROFILE_MEMORY", "1") == "1"
+        self.memory_frames = memory_frames or int(os.getenv("PROFILE_MEMORY_FRAMES", 1))
+        # Comparar snapshots do tracemalloc custa segundos com o heap grande: só na(s) primeira(s)
+        # chamada(s) de cada etapa (nas outras, só o pico de memória, que é barato)
+        self.memory_snapshots = int(os.getenv("PROFILE_MEMORY_SNAPSHOTS", 1))
+
+        self._lock = threading.Lock()
+        # Uma etapa por vez no cProfile/tracemalloc (ver docstring)
+        self._busy = threading.Lock()
+        self._stats = {}
+        self._memory = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        self._peaks = defaultdict(int)
+        self.calls = defaultdict(int)
+        self.skipped = defaultdict(int)
+
+        # Amostragem: etapas abertas em cada thread (a última é a mais interna)
+        self._active = defaultdict(list)
+        self._samples = defaultdict(int)
+        self._stop = threading.Event()
+        self._sampler = None
+
+    @classmethod
+    def from_env(cls, enabled=False):
+        """O profiler configurado pelo ambiente, ou None se o modo de profiling está desligado."""
+        if not (enabled or os.getenv("PROFILE") == "1"):
+            return None
+        return cls()
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.memory_frames)
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="stage-profiler", daemon=True)
+        self._sampler.start()
+        print(f"🔬 Profiling ligado: etapas {', '.join(sorted(self.stages))} -> {self.directory}")
+        return self
+
+    def stop(self):
+        """Para a coleta e grava os arquivos. Retorna o diretório da execução."""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._write()
+        return self.directory
+
+    # --- Coleta ---
+
+    @contextmanager
+    def stage(self, name):
+        if name not in self.stages:
+            yield
+            return
+
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.calls[name] += 1
+            take_snapshot = self.calls[name] <= self.memory_snapshots
+
+        # Não bloqueia: se outra etapa já está no cProfile/tracemalloc, esta só é amostrada
+        owns = self._busy.acquire(blocking=False)
+        if not owns:
+            with self._lock:
+                self.skipped[name] += 1
+
+        profile = None
+        before = None
+        try:
+            if owns:
+                if self.memory and tracemalloc.is_tracing():
+                    # O snapshot vem antes: a memória dele não conta no pico da etapa
+                    snapshot = tracemalloc.take_snapshot() if take_snapshot else None
+                    tracemalloc.reset_peak()
+                    before = (snapshot, tracemalloc.get_traced_memory()[0])
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:
+                    # Python 3.12+: outro profiler (ex: de um debugger) já está ativo
+                    profile = None
+            with self._lock:
+                self._active[thread_id].append(name)
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            # Sai da amostragem antes de juntar os resultados (o custo do profiler não entra nas pilhas)
+            with self._lock:
+                stack = self._active.get(thread_id)
+                if stack and stack[-1] == name:
+                    stack.pop()
+                if not stack:
+                    self._active.pop(thread_id, None)
+            if owns:
+                try:
+                    self._collect(name, profile, before)
+                finally:
+                    self._busy.release()
+
+    def _collect(self, name, profile, before):
+        if before is not None:
+            # Antes do pstats: o que o próprio profiler aloca para os resultados não entra na conta
+            snapshot, start_level = before
+            peak = tracemalloc.get_traced_memory()[1]
+            with self._lock:
+                self._peaks[name] = max(self._peaks[name], peak - start_level)
+            if snapshot is not None:
+                after = tracemalloc.take_snapshot()
+                # Filtra o resultado, não os traces (filter_traces percorre o heap inteiro de novo)
+                diff = [stat for stat in after.compare_to(snapshot, "traceback")
+                        if not _ignored(stat.traceback)]
+            else:
+                diff = []
+            with self._lock:
+                for stat in diff:
+                    if stat.size_diff or stat.count_diff:
+                        entry = self._memory[name][_format_traceback(stat.traceback)]
+                        entry[0] += stat.size_diff
+                        entry[1] += stat.count_diff
+
+        if profile is not None:
+            stats = pstats.Stats(profile)
+            with self._lock:
+                if name in self._stats:
+                    self._stats[name].add(stats)
+                else:
+                    self._stats[name] = stats
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                active = {tid: stages[-1] for tid, stages in self._active.items() if tid != own}
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stage in active.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                key = ";".join([stage] + stack[::-1])
+                with self._lock:
+                    self._samples[key] += 1
+
+    # --- Saída ---
+
+    def _write(self):
+        for name, stats in sorted(self._stats.items()):
+            stats.dump_stats(os.path.join(self.directory, f"{name}.pstats"))
+            with open(os.path.join(self.directory, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"Etapa '{name}': {self.calls[name]} chamadas, {self.skipped[name]} fora do cProfile\n\n")
+                stats.stream = f
+                stats.sort_stats("cumulative").print_stats(40)
+
+        for name, lines in sorted(self._memory.items()):
+            top = sorted(lines.items(), key=lambda item: -item[1][0])[:40]
+            with open(os.path.join(self.directory, f"memory_{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"Etapa '{name}': pico de {self._peaks[name] / 1024:.1f} KiB numa chamada\n")
+                f.write(f"Memória que ficou alocada ao fim da etapa (soma das {min(self.calls[name], self.memory_snapshots)} "
+                        f"primeiras chamadas), por linha:\n\n")
+                for where, (size, count) in top:
+                    f.write(f"{size / 1024:>10.1f} KiB {count:>8} blocos  {where}\n")
+
+        with open(os.path.join(self.directory, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            for key, count in sorted(self._samples.items()):
+                f.write(f"{key} {count}\n")
+
+
+# O próprio profiling não entra nas linhas de memória
+_IGNORED_FILES = {
+    tracemalloc.__file__, __file__, cProfile.__file__, pstats.__file__, "<frozen importlib._bootstrap>",
+}
+
+
+def _ignored(traceback):
+    return any(frame.filename in _IGNORED_FILES for frame in traceback)
+
+
+def _format_traceback(traceback):
+    # A linha que alocou primeiro, seguida de quem a chamou (com PROFILE_MEMORY_FRAMES > 1)
+    return " <- ".join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in reversed(traceback))
@@ -0,0 +1,71 @@
+import re
+import unicodedata
+
+import numpy as np
+
+# Palavras que não ajudam a decidir relevância (pt + en, as fontes atuais misturam os dois)
+STOPWORDS = {
+    "para", "como", "mais", "sobre", "entre", "pelo", "pela", "pelos", "pelas", "isso", "esta", "este",
+    "essa", "esse", "que", "com", "sem", "dos", "das", "nos", "nas", "uma", "por", "não", "nao", "são",
+    "the", "and", "for", "with", "from", "that", "this", "are", "was", "how", "what", "why", "new",
+}
+
+
+def _strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """
+    Tokens normalizados: sem HTML, sem acento, minúsculos, sem stopwords.
+    Um 'stem' grosseiro (6 primeiras letras) junta variações como mercado/mercados, tecnologia/tecnológico.
+    """
+    text = re.sub(r"<[^>]+>", " ", text or "")
+    text = _strip_accents(text.lower())
+    return [token[:6] for token in re.findall(r"[a-z0-9]{3,}", text) if token not in STOPWORDS]
+
+
+def bm25_scores(documents, query_terms, k1=1.5, b=0.75):
+    """
+    BM25 de cada documento (lista de tokens) contra os termos da consulta.
+    A matriz documentos x termos é pequena (só os termos dos interesses), o resto é NumPy.
+    """
+    terms = list(dict.fromkeys(query_terms))
+    if not documents or not terms:
+        return np.zeros(len(documents))
+
+    term_index = {term: i for i, term in enumerate(terms)}
+    tf = np.zeros((len(documents), len(terms)), dtype=np.float64)
+    for d, tokens in enumerate(documents):
+        for token in tokens:
+            i = term_index.get(token)
+            if i is not None:
+                tf[d, i] += 1
+
+    doc_len = np.array([len(tokens) for tokens in documents], dtype=np.float64)
+    avg_len = doc_len.mean() or 1.0
+
+    df = (tf > 0).sum(axis=0)
+    n_docs = len(documents)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    norm = k1 * (1 - b + b * doc_len / avg_len)
+    return ((tf * (k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def rank_candidates(candidates, keywords):
+    """
+    Ordena os candidatos por relevância para os interesses do usuário (título + resumo do feed).
+    Empates mantêm a ordem original (mais recentes de cada fonte primeiro).
+    """
+    if not candidates:
+        return []
+
+    query_terms = [token for keyword in keywords for token in tokenize(keyword)]
+    # O título entra duas vezes: pesa mais que o resumo do feed
+    documents = [tokenize(f"{c['title']} {c['title']} {c.get('summary', '')}") for c in candidates]
+    scores = bm25_scores(documents, query_terms)
+
+    # argsort estável no negativo = maior score primeiro, empates na ordem original
+    order = np.argsort(-scores, kind="stable")
+    return [candidates[i] for i in order]
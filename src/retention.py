@@ -0,0 +1,48 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.models import PipelineCheckpoint, EditionJob, DeliveryOutbox
+
+# Quantas linhas a retenção apaga por transação (não trava a tabela por muito tempo)
+PRUNE_BATCH_SIZE = 5000
+
+
+def prune_rows(db: Session, model, *criteria, batch_size=PRUNE_BATCH_SIZE):
+    """Apaga as linhas de 'model' que atendem 'criteria', em lotes (um commit por lote). Retorna quantas."""
+    total = 0
+    while True:
+        batch = select(model.id).where(*criteria).limit(batch_size)
+        deleted = db.query(model).filter(model.id.in_(batch.scalar_subquery())).delete(synchronize_session=False)
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def prune_run_state(db: Session, days_to_keep, batch_size=PRUNE_BATCH_SIZE):
+    """
+    Apaga o estado das execuções mais antigo que 'days_to_keep' dias: checkpoints e jobs das edições
+    antigas, e os itens da fila de entrega já resolvidos ('sent' ou 'failed'). Itens ainda pendentes ficam.
+    Retorna {tabela: linhas apagadas}.
+    """
+    cutoff = datetime.now() - timedelta(days=days_to_keep)
+    # edition_date é 'YYYY-MM-DD': a comparação de texto segue a ordem das datas
+    cutoff_date = cutoff.strftime('%Y-%m-%d')
+    return {
+        "pipeline_checkpoints": prune_rows(
+            db, PipelineCheckpoint, PipelineCheckpoint.edition_date < cutoff_date, batch_size=batch_size
+        ),
+        "edition_jobs": prune_rows(
+            db, EditionJob, EditionJob.edition_date < cutoff_date, EditionJob.status.in_(("done", "failed")),
+            batch_size=batch_size
+        ),
+        "delivery_outbox": prune_rows(
+            db, DeliveryOutbox, DeliveryOutbox.created_at < cutoff, DeliveryOutbox.status.in_(("sent", "failed")),
+            batch_size=batch_size
+        ),
+    }
@@ -1,4 +1,3 @@
-import feedparser
 import os
 import sys
 
@@ -9,17 +8,29 @@ import uuid
 from newspaper import Article
 from datetime import datetime
 from sqlalchemy.orm import Session
-from src.models import User, NewsHistory
+from src.models import User
+from src.feed_cache import FeedCache
+from src.history import HistoryIndex, find_seen_urls
+from src.article_cache import ArticleCache
+from src.metrics import metrics
 
 class NewsScraper:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, feed_cache: FeedCache = None, history_index: HistoryIndex = None,
+                 article_cache: ArticleCache = None):
         """
         O Scraper agora precisa da sessão do banco de dados para verificar duplicatas.
+        O feed_cache deve ser o mesmo para todos os usuários da execução (cada feed é baixado uma vez).
+        O history_index (Bloom, opcional) evita ir ao banco para URLs que com certeza são novas.
+        O article_cache guarda o texto extraído dos artigos em disco (entre usuários e execuções).
         """
         self.db = db
+        self.feed_cache = feed_cache or FeedCache()
+        self.history_index = history_index
+        self.article_cache = article_cache or ArticleCache()
         self.images_dir = os.path.join("data", "images")
         os.makedirs(self.images_dir, exist_ok=True)
 
+    @metrics.timed("scrape")
     def get_candidates(self, user: User, limit_per_source=5):
         """
         Varre os RSS do usuário e retorna candidatos que AINDA NÃO estão no histórico.
@@ -34,74 +45,103 @@ class NewsScraper:
             print("⚠️ Nenhuma fonte ativa encontrada para este usuário.")
             return []
 
+        # Baixa em paralelo os feeds que ainda não estão no cache (com timeout por feed)
+        self.feed_cache.prefetch([s.url for s in active_sources])
+
+        # 1ª passada: junta as entradas mais recentes de cada fonte
+        entries_by_source = []
         for source in active_sources:
             print(f"   📡 Conectando a: {source.name}...") 
             
             try:
-                # O timeout evita que o script trave se o site estiver fora do ar
-                feed = feedparser.parse(source.url)
+                # Entradas compartilhadas: só o primeiro usuário da execução baixa o feed
+                entries = self.feed_cache.get_entries(source.url)
                 
-                if not feed.entries:
+                if not entries:
                     print(f"      ⚠️  Nenhum item no feed.")
                     continue
 
-                count_added = 0
-                # Analisa os itens mais recentes
-                for entry in feed.entries[:limit_per_source]:
-                    link = entry.link.strip()
-                    title = entry.title.strip()
-
-                    # Verifica se essa URL já foi processada para ESTE usuário
-                    exists = self.db.query(NewsHistory).filter(
-                        NewsHistory.user_id == user.id,
-                        NewsHistory.url == link
-                    ).first()
-
-                    if exists:
-                        # Se já existe, ignora silenciosamente (ou printa para debug)
-                        # print(f"      ↪️ Já vista: {title[:30]}...")
-                        continue
-                    
-                    # Se não existe, adiciona aos candidatos
-                    candidates.append({
-                        "id": str(uuid.uuid4()), 
-                        "title": title,
-                        "url": link,
-                        "source": source.name,
-                        "published": entry.get('published', '')
-                    })
-                    count_added += 1
-                    print(f"      • [NOVA] {title[:40]}...")
-                
-                print(f"      ✅ {count_added} notícias novas selecionadas.")
+                entries_by_source.append((source, entries[:limit_per_source]))
 
             except Exception as e:
+                metrics.error("scrape")
                 print(f"❌ [Erro no feed {source.name}]: {e}")
+
+        # 2ª passada: UMA consulta ao histórico para todas as URLs deste usuário
+        all_links = [entry['link'] for _, entries in entries_by_source for entry in entries]
+        seen_links = self._find_seen_urls(user.id, all_links)
+        # Também evita a mesma notícia duas vezes quando duas fontes publicam o mesmo link
+        added_links = set()
+
+        for source, entries in entries_by_source:
+            count_added = 0
+            for entry in entries:
+                link = entry['link']
+                title = entry['title']
+
+                # Já processada para ESTE usuário: ignora silenciosamente
+                if link in seen_links or link in added_links:
+                    continue
+                
+                # Se não existe, adiciona aos candidatos
+                candidates.append({
+                    "id": str(uuid.uuid4()), 
+                    "title": title,
+                    "url": link,
+                    "source": source.name,
+                    "published": entry['published'],
+                    "summary": entry['summary']
+                })
+                added_links.add(link)
+                count_added += 1
+                print(f"      • [NOVA] {title[:40]}...")
+            
+            print(f"      ✅ {source.name}: {count_added} notícias novas selecionadas.")
         
         print(f"\n💬 Total: {len(candidates)} candidatos novos encontrados.\n")
         return candidates
 
+    def _find_seen_urls(self, user_id, urls):
+        if not urls:
+            return set()
+        if self.history_index is not None:
+            return self.history_index.find_seen_urls(self.db, user_id, urls)
+        return find_seen_urls(self.db, user_id, urls)
+
+    @metrics.timed("download")
     def download_article_content(self, url):
         """
-        Mantemos igual: Baixa o conteúdo completo usando Newspaper3k
+        Baixa o conteúdo completo usando Newspaper3k.
+        O texto extraído fica no article_cache (por URL canônica) e é reaproveitado
+        por outros usuários e pelas próximas execuções.
         """
-        try:
+        def fetch():
             article = Article(url, language='pt')
             article.download()
             article.parse()
-            
+            return {
+                "content": article.text,
+                "image_url": article.top_image,
+                "authors": article.authors
+            }
+
+        try:
+            # Dois usuários pedindo o mesmo artigo ao mesmo tempo: um download só
+            cached = self.article_cache.get_or_load(url, fetch)
+
             # Baixa imagem (Lógica simplificada: sempre baixa se tiver)
             local_image_path = None
-            # if article.top_image:
-            #     local_image_path = self._download_image(article.top_image)
+            # if cached['image_url']:
+            #     local_image_path = self._download_image(cached['image_url'])
 
             return {
-                "content": article.text,
-                "image_url": article.top_image,
+                "content": cached['content'],
+                "image_url": cached['image_url'],
                 "local_image_path": local_image_path,
-                "authors": article.authors
+                "authors": cached['authors']
             }
         except Exception as e:
+            metrics.error("download")
             print(f"❌ [Erro ao baixar artigo {url}]: {e}")
             return None
 
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SharedRequests:
+    """
+    Pedidos ao Gemini compartilhados entre usuários dentro de UMA execução (single-flight).
+    Usuários criados a partir dos mesmos tópicos e fontes geram o mesmo pedido (ex: a mesma curadoria);
+    a chave canônica do pedido é calculada uma vez só e o resultado vai para todos:
+    - quem pede uma chave já calculada recebe o resultado guardado
+    - quem pede uma chave em andamento (outro worker) espera o primeiro terminar
+    Um erro vai para quem estava esperando, mas não fica guardado: o próximo pedido tenta de novo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._flights = {}
+        self.stats = {}
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def do(self, kind, key, fn):
+        """Retorna (resultado, compartilhado): compartilhado=True se veio do pedido de outro usuário."""
+        key = (kind, key)
+        with self._lock:
+            if key in self._results:
+                self._count(kind, "shared")
+                return self._results[key], True
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            with self._lock:
+                self._count(kind, "shared")
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._results[key] = flight.result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                self._count(kind, "calls")
+            flight.done.set()
+        return flight.result, False
+
+    def _count(self, kind, name):
+        self.stats[f"{kind}_{name}"] = self.stats.get(f"{kind}_{name}", 0) + 1
+
+    def print_stats(self):
+        kinds = sorted({name.rsplit("_", 1)[0] for name in self.stats})
+        for kind in kinds:
+            calls, shared = self.stats.get(f"{kind}_calls", 0), self.stats.get(f"{kind}_shared", 0)
+            print(f"🤝 Pedidos de {kind}: {calls} ao Gemini, {shared} reaproveitados de outros usuários.")
@@ -0,0 +1,68 @@
+import os
+import sys
+from dataclasses import dataclass
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session, selectinload
+from src.models import User, Source
+
+
+# Cópias imutáveis e leves do que o pipeline lê de um usuário.
+# Não dependem de sessão (nada de lazy-load escondido) e podem ir para outras threads/processos.
+# Os nomes dos campos são os mesmos dos models, então o scraper e o curador aceitam os dois.
+
+@dataclass(frozen=True)
+class SourceSnapshot:
+    name: str
+    url: str
+    is_active: bool = True
+
+
+@dataclass(frozen=True)
+class InterestSnapshot:
+    keyword: str
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    name: str
+    email: str
+    kindle_email: str
+    sources: tuple = ()
+    interests: tuple = ()
+    output_formats: str = "epub,pdf"
+
+    @property
+    def wants_pdf(self):
+        return "pdf" in [fmt.strip() for fmt in self.output_formats.split(",")]
+
+    @classmethod
+    def from_model(cls, user: User):
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            kindle_email=user.kindle_email,
+            sources=tuple(SourceSnapshot(s.name, s.url) for s in user.sources if s.is_active),
+            interests=tuple(InterestSnapshot(i.keyword) for i in user.interests),
+            output_formats=user.output_formats or "epub,pdf"
+        )
+
+
+def load_active_users(db: Session, user_ids=None):
+    """
+    Carrega os usuários ativos (ou só 'user_ids') com fontes ativas e interesses
+    em 3 consultas no total, não importa quantos usuários: selectinload em vez de
+    um lazy-load de user.sources e outro de user.interests por usuário.
+    """
+    query = db.query(User).options(
+        selectinload(User.sources.and_(Source.is_active == True)),
+        selectinload(User.interests)
+    ).filter(User.is_active == True).order_by(User.id)
+
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+
+    return [UserSnapshot.from_model(user) for user in query.all()]
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.disk_cache import DiskCache
+
+
+class SummaryCache:
+    """
+    Cache dos resumos da IA. O resumo não depende do usuário, só de:
+    (hash do conteúdo, modelo do Gemini, versão do prompt).
+    Quando o template do prompt muda, a versão muda e os resumos antigos são apagados.
+    """
+
+    def __init__(self, model_name, prompt_version, directory=None, ttl_days=None, max_mb=None):
+        directory = directory or os.getenv("SUMMARY_CACHE_DIR", os.path.join("data", "cache", "summaries"))
+        ttl_days = ttl_days or float(os.getenv("SUMMARY_CACHE_TTL_DAYS", 30))
+        max_mb = max_mb or float(os.getenv("SUMMARY_CACHE_MAX_MB", 100))
+
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.store = DiskCache(directory, ttl_seconds=ttl_days * 86400, max_bytes=int(max_mb * 1024 * 1024))
+        self._invalidate_if_prompt_changed()
+
+    @property
+    def stats(self):
+        return self.store.stats
+
+    @staticmethod
+    def content_hash(title, content):
+        return hashlib.sha256(f"{title}\n{content}".encode("utf-8")).hexdigest()
+
+    def _key(self, title, content):
+        return f"{self.content_hash(title, content)}|{self.model_name}|{self.prompt_version}"
+
+    def get(self, title, content):
+        cached = self.store.get(self._key(title, content))
+        return cached["summary"] if cached else None
+
+    def set(self, title, content, summary):
+        self.store.set(self._key(title, content), {
+            "summary": summary,
+            "model": self.model_name,
+            "prompt_version": self.prompt_version,
+        })
+
+    def _invalidate_if_prompt_changed(self):
+        """Apaga os resumos de outras versões do prompt (uma vez, quando a versão muda)."""
+        marker = os.path.join(self.store.directory, "PROMPT_VERSION")
+        try:
+            with open(marker, "r", encoding="utf-8") as f:
+                if f.read().strip() == self.prompt_version:
+                    return
+        except OSError:
+            pass
+
+        removed = self.invalidate()
+        if removed:
+            print(f"🧽 Prompt de resumo mudou: {removed} resumos antigos removidos do cache.")
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(self.prompt_version)
+
+    def invalidate(self, all_versions=False):
+        """Remove resumos de outras versões do prompt (ou todos, com all_versions=True)."""
+        if all_versions:
+            return self.store.purge(lambda value: True)
+        return self.store.purge(lambda value: value.get("prompt_version") != self.prompt_version)
+
+    def print_stats(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        rate = (self.stats["hits"] / total * 100) if total else 0
+        print(f"🧾 Resumos: {self.stats['hits']} do cache, {self.stats['misses']} gerados ({rate:.0f}% de acerto).")